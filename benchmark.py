@@ -0,0 +1,422 @@
+"""Benchmark the dashboard's loaders and chart builders on synthetic GIAS-sized data.
+
+Generate a synthetic schools.db with the same tables ingest.py builds and
+realistic cardinalities (about 150 local authorities, a few thousand trusts,
+skewed type/phase/religion mixes, clustered postcodes):
+
+    python benchmark.py generate --rows 500000 --db bench_500000.db
+
+Time every loader and figure builder against it, cold (caches cleared) and
+warm, under a set of representative filter mixes, and write the results as
+JSON:
+
+    python benchmark.py run --db bench_500000.db --output results.json
+
+Or do both for the standard 50k / 500k / 5M sizes (databases are generated
+once and reused):
+
+    python benchmark.py suite --output-dir benchmarks
+
+Compare two result files, e.g. before and after a change; exits non-zero
+when anything got slower than --threshold:
+
+    python benchmark.py compare old.json new.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import ingest
+
+SUITE_SIZES = [50000, 500000, 5000000]
+
+# Value -> relative frequency, roughly as in the GIAS open establishments
+TYPE_GROUPS = {
+    'Local authority maintained schools': 40, 'Academies': 36, 'Independent schools': 9,
+    'Special schools': 4, 'Free Schools': 3, 'Colleges': 3, 'Other types': 2,
+    'Online provider': 1, 'Universities': 0.5, 'Welsh schools': 0.5
+}
+PHASES = {
+    'Primary': 55, 'Not applicable': 22, 'Secondary': 13, '16 plus': 4, 'All-through': 3,
+    'Nursery': 2, 'Middle deemed primary': 0.5, 'Middle deemed secondary': 0.5
+}
+GENDERS = {'Mixed': 93, 'Girls': 3.5, 'Boys': 3, 'Unknown': 0.5}
+RELIGIONS = {
+    'Does not apply': 35, 'None': 35, 'Church of England': 16, 'Roman Catholic': 9, 'Christian': 2,
+    'Jewish': 1, 'Muslim': 1, 'Sikh': 0.3, 'Hindu': 0.2, 'Unknown': 0.5
+}
+TYPES = [
+    'Community school', 'Academy converter', 'Academy sponsor led', 'Voluntary aided school',
+    'Voluntary controlled school', 'Foundation school', 'Other independent school', 'Free schools',
+    'Community special school', 'Further education', 'Pupil referral unit', 'Studio schools'
+]
+NAME_PARTS = [
+    'Oak', 'Elm', 'Ash', 'Birch', 'Cedar', 'Willow', 'Hazel', 'Rowan', 'Park', 'Hill', 'Green', 'Brook',
+    'Field', 'Bridge', 'Grange', 'Manor', 'Valley', 'Meadow', 'Church', 'Castle', 'Mill', 'Wood', 'Lea', 'Ford'
+]
+NAME_KINDS = [
+    'Primary School', 'Academy', 'Infant School', 'Junior School', 'High School', 'College',
+    'Church of England Primary School', 'Catholic Primary School', 'School', 'Community School'
+]
+SAINTS = ['St Mary\'s', 'St John\'s', 'St Peter\'s', 'St Joseph\'s', 'All Saints', 'Holy Trinity', 'St Michael\'s']
+
+LOCAL_AUTHORITY_COUNT = 153
+POSTCODE_DISTRICT_COUNT = 2900
+
+# Rows generated and written per transaction
+GENERATE_CHUNK = 200000
+
+
+def _pick(rng, weights, size):
+    values = list(weights)
+    p = np.array([weights[value] for value in values], dtype=float)
+    return np.array(values, dtype=object)[rng.choice(len(values), size=size, p=p / p.sum())]
+
+
+def _skewed(rng, count, size, skew=0.8):
+    """Indices 0..count-1 where low indices are more frequent, like LA and trust sizes"""
+    p = 1 / np.arange(1, count + 1) ** skew
+    return rng.choice(count, size=size, p=p / p.sum())
+
+
+def postcode_pool(rows, seed=0):
+    """Synthetic postcodes with centroids, clustered around postcode districts in England"""
+    rng = np.random.default_rng([seed, 1])
+    size = max(1000, rows // 2)
+    areas = np.array([a + b for a in 'BCDEGHLMNPRSTW' for b in ['', 'A', 'E', 'L', 'N', 'R', 'S', 'T']], dtype=object)
+    district_area = areas[rng.integers(0, len(areas), POSTCODE_DISTRICT_COUNT)]
+    district_number = rng.integers(1, 30, POSTCODE_DISTRICT_COUNT).astype(str)
+    district_lat = rng.uniform(50.2, 55.7, POSTCODE_DISTRICT_COUNT)
+    district_lon = rng.uniform(-5.5, 1.6, POSTCODE_DISTRICT_COUNT)
+
+    district = rng.integers(0, POSTCODE_DISTRICT_COUNT, size)
+    letters = np.array(list('ABDEFGHJLNPQRSTUWXYZ'), dtype=object)
+    inward = (
+        rng.integers(0, 10, size).astype(str).astype(object)
+        + letters[rng.integers(0, len(letters), size)] + letters[rng.integers(0, len(letters), size)]
+    )
+    pool = pd.DataFrame({
+        'postcode': district_area[district] + district_number[district].astype(object) + ' ' + inward,
+        'lat': district_lat[district] + rng.normal(0, 0.02, size),
+        'lon': district_lon[district] + rng.normal(0, 0.03, size)
+    })
+    return pool.drop_duplicates('postcode', ignore_index=True)
+
+
+def synthetic_schools(start, size, postcodes, trust_count, seed=0):
+    """A chunk of synthetic rows of the schools table, URNs from 100000 + start"""
+    rng = np.random.default_rng([seed, 2, start])
+    parts = np.array(NAME_PARTS, dtype=object)
+    kinds = np.array(NAME_KINDS, dtype=object)
+    saints = np.array(SAINTS, dtype=object)
+    names = parts[rng.integers(0, len(parts), size)] + ' ' + kinds[rng.integers(0, len(kinds), size)]
+    with_second = rng.random(size) < 0.4
+    names[with_second] = parts[rng.integers(0, len(parts), with_second.sum())] + names[with_second]
+    with_saint = rng.random(size) < 0.15
+    names[with_saint] = saints[rng.integers(0, len(saints), with_saint.sum())] + ' ' + names[with_saint]
+
+    trusts = np.array(['Unknown'] * size, dtype=object)
+    in_trust = rng.random(size) < 0.4
+    trust_ids = _skewed(rng, trust_count, in_trust.sum())
+    trusts[in_trust] = [f'{NAME_PARTS[i % len(NAME_PARTS)]} Learning Trust {i}' for i in trust_ids]
+
+    located = postcodes.iloc[rng.integers(0, len(postcodes), size)]
+    capacity = rng.integers(30, 2000, size).astype(float)
+    rows = pd.DataFrame({
+        'URN': np.arange(100000 + start, 100000 + start + size),
+        'EstablishmentName': names,
+        'LA (name)': [f'Local Authority {i + 1:03d}' for i in _skewed(rng, LOCAL_AUTHORITY_COUNT, size, skew=0.3)],
+        'TypeOfEstablishment (name)': np.array(TYPES, dtype=object)[rng.integers(0, len(TYPES), size)],
+        'EstablishmentTypeGroup (name)': _pick(rng, TYPE_GROUPS, size),
+        'PhaseOfEducation (name)': _pick(rng, PHASES, size),
+        'Trusts (name)': trusts,
+        'Gender (name)': _pick(rng, GENDERS, size),
+        'ReligiousCharacter (name)': _pick(rng, RELIGIONS, size),
+        'Postcode': located['postcode'].to_numpy(),
+        'SchoolCapacity': capacity,
+        'NumberOfPupils': np.floor(capacity * rng.uniform(0.6, 1.05, size)),
+        'StatutoryLowAge': 4.0,
+        'StatutoryHighAge': 11.0,
+        'PercentageFSM': np.round(rng.gamma(2.0, 10.0, size).clip(0, 100), 1)
+    })
+    for column in ingest.SCHOOL_COLUMNS:
+        if column not in rows:
+            rows[column] = 'Unknown'
+    rows = rows[ingest.SCHOOL_COLUMNS]
+    rows['row_hash'] = ingest.row_hashes(rows)
+    return rows
+
+
+def generate(db_path, rows, seed=0):
+    """Write a synthetic database of the given size, with rollups, catalog and locations"""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    ingest.ensure_schools_table(conn)
+
+    postcodes = postcode_pool(rows, seed)
+    trust_count = max(100, rows // 10)
+    for start in range(0, rows, GENERATE_CHUNK):
+        ingest.upsert_rows(conn, synthetic_schools(start, min(GENERATE_CHUNK, rows - start), postcodes, trust_count, seed))
+
+    with conn:
+        ingest.ensure_postcodes_table(conn)
+        conn.executemany(
+            'INSERT INTO postcodes (postcode, lat, lon) VALUES (?, ?, ?)',
+            postcodes.itertuples(index=False, name=None)
+        )
+        ingest.build_derived_tables(conn)
+        ingest.stamp_version(conn)
+    conn.close()
+
+
+def _result_rows(value):
+    # Size of a loader's result, for the report
+    if isinstance(value, tuple):
+        return _result_rows(value[0])
+    if isinstance(value, (pd.DataFrame, list, dict, np.ndarray)):
+        return len(value)
+    return None
+
+
+def filter_mixes(app):
+    """Representative filter sets, built from the most common values in the database"""
+    catalog = app.load_dimension_catalog()
+
+    def common(column, count=1):
+        values = catalog[column].sort_values('Count', ascending=False)[column]
+        return values.iloc[0] if count == 1 else values.iloc[:count].tolist()
+
+    la = common('LA (name)')
+    postcode = app.read_sql(
+        'SELECT Postcode FROM schools GROUP BY Postcode ORDER BY COUNT(*) DESC LIMIT 1'
+    ).iloc[0, 0]
+    mixes = {
+        'unfiltered': {},
+        'la': {'la': la},
+        'la+phase': {'la': la, 'phase': 'Primary'},
+        'groups+gender': {'establishment_groups': common('EstablishmentTypeGroup (name)', 2), 'gender': 'Mixed'},
+        'name': {'name': 'park'},
+        'name+la+religion': {'name': 'oak', 'la': la, 'religion': 'Church of England'},
+        'trust': {'trust_name': common('Trusts (name)')},
+        'postcode prefix': {'postcode': postcode.split()[0]}
+    }
+    if app.locations_available():
+        mixes['near 5 km'] = {'near_postcode': postcode, 'radius_km': 5}
+    return {label: app.normalize_filters(dict(app.DEFAULT_FILTERS, **filters)) for label, filters in mixes.items()}
+
+
+def run(db_path, engine="sql", repeat=5):
+    """Time the loaders and figure builders against db_path; returns the report as a dict"""
+    # combined_app reads its configuration when imported
+    os.environ["SCHOOLS_DB"] = db_path
+    os.environ["SCHOOLS_FILTER_ENGINE"] = engine
+    # Outside "streamlit run" every st call warns about the missing script context
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
+    import combined_app as app
+
+    startup = []
+
+    def once(name, call):
+        started = time.perf_counter()
+        call()
+        startup.append({"name": name, "ms": round((time.perf_counter() - started) * 1000, 3)})
+
+    once("prepare_database", app.get_pool)
+    once("load_dimension_catalog", app.load_dimension_catalog)
+    if engine == "memory":
+        once("get_filter_index", lambda: app.get_filter_index(app.data_version()))
+    once("get_suggestion_index", lambda: app.get_suggestion_index('EstablishmentName', app.data_version()))
+
+    def clear_caches():
+        for cache in app._loader_caches().values():
+            cache.clear()
+        app._built_figure.clear()
+        app._compile_filters.cache_clear()
+
+    results = []
+
+    def measure(name, case, filters, call):
+        cold, warm = [], []
+        value = None
+        for _ in range(repeat):
+            clear_caches()
+            started = time.perf_counter()
+            value = call()
+            cold.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            call()
+            warm.append(time.perf_counter() - started)
+        results.append({
+            "name": name,
+            "case": case,
+            "filters": filters,
+            "cold_ms": round(statistics.median(cold) * 1000, 3),
+            "warm_ms": round(statistics.median(warm) * 1000, 3),
+            "rows": _result_rows(value)
+        })
+        return value
+
+    charts = {
+        "create_school_types_chart": ("school_types", app.create_school_types_chart),
+        "create_phase_chart": ("phase_summary", app.create_phase_chart),
+        "create_religion_chart": ("religion_summary", app.create_religion_chart),
+        "create_gender_chart": ("gender_summary", app.create_gender_chart)
+    }
+
+    mixes = filter_mixes(app)
+    for label, filters in mixes.items():
+        _, total = measure("search_schools", "page 1", label, lambda: app.search_schools(filters, page=1, per_page=50))
+        last_page = max(1, (total + 49) // 50)
+        for page in sorted({2, 10, last_page} - {1}):
+            if page <= last_page:
+                measure("search_schools", f"page {page}", label, lambda: app.search_schools(filters, page=page, per_page=50))
+
+        measure("load_summary_stats", "", label, lambda: app.load_summary_stats(filters))
+        for loader in (app.load_school_types, app.load_phase_summary, app.load_religion_summary, app.load_gender_summary):
+            measure(loader.__name__, "", label, lambda: loader(filters))
+        measure("load_facet_counts", "", label, lambda: app.load_facet_counts(filters))
+
+        aggregates = app.load_dashboard_aggregates(filters)
+        for name, (key, builder) in charts.items():
+            measure(name, "", label, lambda: builder(aggregates[key]))
+
+        if app.locations_available():
+            located = app.load_school_locations(filters)
+            if not located.empty:
+                centre = (round(float(located['lat'].mean()), 4), round(float(located['lon'].mean()), 4))
+                for zoom in (6, app.MAP_DETAIL_ZOOM):
+                    measure("load_map_markers", f"zoom {zoom}", label, lambda: app.load_map_markers(filters, zoom, centre))
+
+    trust = dict(mixes['trust'])['trust_name']
+    trust = app.read_sql(
+        'SELECT "Trusts (name)" FROM schools WHERE lower("Trusts (name)") = ? LIMIT 1', params=[trust]
+    ).iloc[0, 0]
+    measure("load_trust_profile", "largest trust", None, lambda: app.load_trust_profile(trust))
+    for page in (1, 10):
+        measure("get_trust_schools", f"largest trust, page {page}", None, lambda: app.get_trust_schools(trust, page=page, per_page=50))
+    urn = int(app.read_sql('SELECT MIN(URN) FROM schools').iloc[0, 0])
+    measure("get_school_details", "", None, lambda: app.get_school_details(urn))
+    for term in ("st marys", "oak acadmy", "willow primary school"):
+        measure("find_similar_schools", term, None, lambda: app.find_similar_schools(term, limit=5))
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        "created": datetime.now().isoformat(timespec='seconds'),
+        "commit": commit,
+        "database": os.path.abspath(db_path),
+        "rows": int(app.read_sql('SELECT COUNT(*) FROM schools').iloc[0, 0]),
+        "engine": engine,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "startup": startup,
+        "results": results
+    }
+
+
+def compare(old_path, new_path, threshold=1.25):
+    """Print the change in each timing between two result files; returns the regressions"""
+    with open(old_path) as old_file, open(new_path) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+
+    key = lambda result: (result["name"], result["case"], result["filters"])
+    before = {key(result): result for result in old["results"]}
+    regressions = []
+    print(f"{'loader':<28} {'case':<22} {'filters':<18} {'cold ms':>18} {'warm ms':>18}")
+    for result in new["results"]:
+        previous = before.get(key(result))
+        if previous is None:
+            continue
+        columns = []
+        for timing in ("cold_ms", "warm_ms"):
+            ratio = result[timing] / previous[timing] if previous[timing] else 1.0
+            columns.append(f"{previous[timing]:.1f} -> {result[timing]:.1f}")
+            # Sub-millisecond timings are too noisy to call a regression
+            if ratio > threshold and result[timing] - previous[timing] > 1:
+                regressions.append((key(result), timing, ratio))
+        print(f"{result['name']:<28} {result['case']:<22} {str(result['filters']):<18} {columns[0]:>18} {columns[1]:>18}")
+
+    for (name, case, filters), timing, ratio in regressions:
+        print(f"Slower: {name} {case} [{filters}] {timing} x{ratio:.2f}")
+    return regressions
+
+
+def write_report(report, output):
+    with open(output, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f"{len(report['results'])} timings for {report['rows']:,} rows written to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard on synthetic GIAS-sized data")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate", help="Write a synthetic schools database")
+    generate_parser.add_argument("--rows", type=int, default=50000, help="Number of schools")
+    generate_parser.add_argument("--db", required=True, help="Database file to create (replaced if it exists)")
+    generate_parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+    run_parser = commands.add_parser("run", help="Time the loaders and figure builders against a database")
+    run_parser.add_argument("--db", required=True, help="Database to benchmark")
+    run_parser.add_argument("--output", required=True, help="JSON file to write the results to")
+    run_parser.add_argument("--engine", choices=["sql", "memory"], default="sql", help="Filter engine to benchmark")
+    run_parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the median is reported")
+
+    suite_parser = commands.add_parser("suite", help="Generate (once) and benchmark the standard sizes")
+    suite_parser.add_argument("--sizes", type=int, nargs="+", default=SUITE_SIZES, help="Database sizes in rows")
+    suite_parser.add_argument("--output-dir", default="benchmarks", help="Directory for databases and results")
+    suite_parser.add_argument("--engine", choices=["sql", "memory"], default="sql", help="Filter engine to benchmark")
+    suite_parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the median is reported")
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("old", help="Baseline results")
+    compare_parser.add_argument("new", help="New results")
+    compare_parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        started = time.time()
+        generate(args.db, args.rows, seed=args.seed)
+        print(f"{args.rows:,} schools written to {args.db} in {time.time() - started:.1f}s")
+    elif args.command == "run":
+        write_report(run(args.db, engine=args.engine, repeat=args.repeat), args.output)
+    elif args.command == "suite":
+        os.makedirs(args.output_dir, exist_ok=True)
+        for rows in args.sizes:
+            db_path = os.path.join(args.output_dir, f"synthetic_{rows}.db")
+            if not os.path.exists(db_path):
+                generate(db_path, rows)
+            # Each size runs in its own process, since combined_app is configured at import
+            subprocess.run([
+                sys.executable, os.path.abspath(__file__), "run", "--db", db_path,
+                "--output", os.path.join(args.output_dir, f"results_{rows}_{args.engine}.json"),
+                "--engine", args.engine, "--repeat", str(args.repeat)
+            ], check=True)
+    elif args.command == "compare":
+        if compare(args.old, args.new, threshold=args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
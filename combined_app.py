@@ -3,9 +3,28 @@ import pandas as pd
 import sqlite3
 import plotly.express as px
 import plotly.graph_objects as go
+import numpy as np
 from datetime import datetime
+import os
 import re
 import base64
+import functools
+import hashlib
+import json
+import logging
+import pickle
+import threading
+import time
+import gzip
+import queue
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from fuzzywuzzy import fuzz
+from ingest import FSM_BANDS, FSM_TOP_BAND, FSM_UNPUBLISHED
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from collections import OrderedDict
 
 # Set page configuration
 st.set_page_config(
@@ -15,520 +34,1636 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Database connection
+class LoaderCache:
+    """LRU cache of one loader's results, bounded by their pickled size.
+
+    Results are stored pickled, like st.cache_data, so every hit hands out a
+    fresh copy and the size of each entry is known exactly. Entries older
+    than ttl seconds are treated as misses.
+    """
+
+    def __init__(self, name, max_bytes, ttl=None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl is not None and time.time() - entry[1] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, payload, version=None):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            # A result bigger than the whole budget is returned but not kept
+            if len(payload) > self.max_bytes:
+                return
+            self.entries[key] = (payload, time.time(), version)
+            self.size += len(payload)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        payload = self.entries.pop(key)[0]
+        self.size -= len(payload)
+
+    def drop_stale(self, version):
+        """Drop entries computed for any data version other than the given one"""
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if entry[2] != version]:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        return {
+            "loader": self.name,
+            "entries": len(self.entries),
+            "size_mb": round(self.size / 2**20, 2),
+            "budget_mb": round(self.max_bytes / 2**20, 2),
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
 @st.cache_resource
-def get_connection():
-    return sqlite3.connect("schools.db", check_same_thread=False)
+def _loader_caches():
+    # Shared by every session for the life of the server process
+    return {}
 
-# Load data with caching
-@st.cache_data
-def load_metadata():
-    conn = get_connection()
-    metadata = pd.read_sql("SELECT * FROM metadata", conn)
-    return metadata.iloc[0]
+# Set SCHOOLS_PROFILE=1 to time every loader, query, chart, export and panel.
+# Timings show in the ?debug=1 panel; SCHOOLS_PROFILE_LOG appends each call to
+# a JSON lines file and SCHOOLS_PROFILE_METRICS rewrites a Prometheus text file
+# (for the node_exporter textfile collector) after every run
+PROFILING = os.environ.get("SCHOOLS_PROFILE") == "1"
+PROFILE_LOG = os.environ.get("SCHOOLS_PROFILE_LOG")
+PROFILE_METRICS = os.environ.get("SCHOOLS_PROFILE_METRICS")
 
-@st.cache_data
-def load_school_types(filters=None):
-    conn = get_connection()
-    
-    query = '''
-        SELECT "EstablishmentTypeGroup (name)" as EstablishmentTypeGroup, 
-               COUNT(*) as Count
-        FROM schools
-        WHERE 1=1
-    '''
-    params = []
-    
-    if filters:
-        if filters.get('name'):
-            query += ' AND EstablishmentName LIKE ?'
-            params.append(f'%{filters["name"]}%')
-            
-        if filters.get('trust_name'):
-            query += ' AND "Trusts (name)" LIKE ?'
-            params.append(f'%{filters["trust_name"]}%')
-        
-        if filters.get('la'):
-            query += ' AND "LA (name)" = ?'
-            params.append(filters["la"])
-        
-        # Using establishment_groups instead of school_types (from updated_app.py)
-        if filters.get('establishment_groups') and len(filters["establishment_groups"]) > 0:
-            placeholders = ', '.join(['?' for _ in filters["establishment_groups"]])
-            query += f' AND "EstablishmentTypeGroup (name)" IN ({placeholders})'
-            params.extend(filters["establishment_groups"])
-        
-        if filters.get('phase'):
-            query += ' AND "PhaseOfEducation (name)" = ?'
-            params.append(filters["phase"])
+def result_rows(value):
+    """Rows in a call's result, where that means anything"""
+    if isinstance(value, tuple) and value:
+        return result_rows(value[0])
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray, list, dict)):
+        return len(value)
+    return None
+
+class Profiler:
+    """Timings of instrumented calls, per session run and in total.
+
+    Every call is recorded with its kind (loader, query, figure, export or
+    render), duration, cache outcome, rows returned and bytes cached. The
+    calls of each session's latest run are kept for the debug panel and the
+    per-call totals for the Prometheus metrics.
+    """
+
+    def __init__(self, log_path=None, sessions=100):
+        self.totals = {}
+        self.runs = OrderedDict()
+        self.sessions = sessions
+        self.lock = threading.Lock()
+        self.log = None
+        if log_path:
+            self.log = logging.getLogger("schools_dashboard.profile")
+            self.log.setLevel(logging.INFO)
+            self.log.propagate = False
+            handler = logging.FileHandler(log_path)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.log.addHandler(handler)
+
+    def start_run(self, session_id):
+        with self.lock:
+            self.runs[session_id] = []
+            self.runs.move_to_end(session_id)
+            while len(self.runs) > self.sessions:
+                self.runs.popitem(last=False)
+
+    def record(self, kind, name, seconds, cache=None, rows=None, nbytes=None):
+        ctx = get_script_run_ctx(suppress_warning=True)
+        session_id = ctx.session_id if ctx else None
+        call = {
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "session": session_id,
+            "kind": kind,
+            "name": name,
+            "ms": round(seconds * 1000, 3),
+            "cache": cache,
+            "rows": rows,
+            "bytes": nbytes
+        }
+        with self.lock:
+            total = self.totals.get((kind, name))
+            if total is None:
+                total = self.totals[(kind, name)] = {"calls": 0, "hits": 0, "misses": 0, "seconds": 0.0, "rows": 0, "bytes": 0}
+            total["calls"] += 1
+            total["hits"] += cache == "hit"
+            total["misses"] += cache == "miss"
+            total["seconds"] += seconds
+            total["rows"] += rows or 0
+            total["bytes"] += nbytes or 0
+            if session_id in self.runs:
+                self.runs[session_id].append(call)
+        if self.log:
+            self.log.info(json.dumps(call))
+
+    def run_calls(self, session_id):
+        with self.lock:
+            return list(self.runs.get(session_id, []))
+
+    def summary(self):
+        with self.lock:
+            totals = [(kind, name, dict(total)) for (kind, name), total in self.totals.items()]
+        return pd.DataFrame([{
+            "kind": kind,
+            "name": name,
+            "calls": total["calls"],
+            "hit_rate": round(total["hits"] / (total["hits"] + total["misses"]), 2) if total["hits"] + total["misses"] else None,
+            "total_ms": round(total["seconds"] * 1000, 1),
+            "mean_ms": round(total["seconds"] * 1000 / total["calls"], 2),
+            "rows": total["rows"],
+            "bytes": total["bytes"]
+        } for kind, name, total in totals])
+
+    def prometheus(self):
+        """The totals as Prometheus counters, in the text exposition format"""
+        metrics = [
+            ("schools_dashboard_calls_total", "Instrumented calls", "calls"),
+            ("schools_dashboard_cache_hits_total", "Calls answered from a cache", "hits"),
+            ("schools_dashboard_cache_misses_total", "Calls that missed their cache", "misses"),
+            ("schools_dashboard_call_seconds_total", "Time spent in calls, including nested calls", "seconds"),
+            ("schools_dashboard_rows_total", "Rows returned by calls", "rows"),
+            ("schools_dashboard_cached_bytes_total", "Pickled bytes of cached results returned or stored", "bytes")
+        ]
+        with self.lock:
+            totals = sorted((key, dict(total)) for key, total in self.totals.items())
+        lines = []
+        for metric, help_text, field in metrics:
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            for (kind, name), total in totals:
+                lines.append(f'{metric}{{kind="{kind}",name="{name}"}} {total[field]}')
+        return "\n".join(lines) + "\n"
+
+@st.cache_resource
+def get_profiler():
+    return Profiler(PROFILE_LOG)
+
+# Loader whose query is running on this thread, to attribute queries to loaders
+_profile_scope = threading.local()
+
+@contextmanager
+def profile_scope(name):
+    outer = getattr(_profile_scope, "name", None)
+    _profile_scope.name = name
+    try:
+        yield
+    finally:
+        _profile_scope.name = outer
+
+def profiled(kind, size=None):
+    """Record every call in the profiler; size(result) gives the bytes produced, if any"""
+    def decorator(func):
+        if not PROFILING:
+            return func
         
-        # Keep the original postcode filter (from fixed_app.py)
-        if filters.get('postcode'):
-            query += ' AND Postcode LIKE ?'
-            params.append(f'{filters["postcode"]}%')
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            with profile_scope(func.__name__):
+                result = func(*args, **kwargs)
+            get_profiler().record(
+                kind, func.__name__, time.perf_counter() - started,
+                rows=result_rows(result), nbytes=size(result) if size else None
+            )
+            return result
+        return wrapper
+    return decorator
+
+def profile_metrics():
+    """Profiler counters plus the current size of each loader cache, in Prometheus text format"""
+    lines = [
+        "# HELP schools_dashboard_loader_cache_bytes Pickled bytes held in each loader cache",
+        "# TYPE schools_dashboard_loader_cache_bytes gauge"
+    ]
+    for name, cache in sorted(_loader_caches().items()):
+        lines.append(f'schools_dashboard_loader_cache_bytes{{loader="{name}"}} {cache.size}')
+    return get_profiler().prometheus() + "\n".join(lines) + "\n"
+
+def write_profile_metrics(path):
+    # Written aside and renamed so a scrape never reads a half-written file
+    with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp", delete=False) as output:
+        output.write(profile_metrics())
+    os.replace(output.name, path)
+
+def cached_loader(max_mb, ttl=None):
+    """Cache a loader's results in its own size-bounded LRU (replaces st.cache_data)"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            caches = _loader_caches()
+            cache = caches.get(func.__name__)
+            if cache is None:
+                cache = caches.setdefault(func.__name__, LoaderCache(func.__name__, int(max_mb * 2**20), ttl))
             
-        if filters.get('gender'):
-            query += ' AND "Gender (name)" = ?'
-            params.append(filters["gender"])
+            # Keyed on the data version so a database refresh never serves stale results
+            version = data_version()
+            key = hashlib.sha1(pickle.dumps((version, args, sorted(kwargs.items())))).hexdigest()
+            started = time.perf_counter()
+            payload = cache.get(key)
+            if payload is not None:
+                result = pickle.loads(payload)
+                if PROFILING:
+                    get_profiler().record("loader", func.__name__, time.perf_counter() - started, "hit", result_rows(result), len(payload))
+                return result
             
-        if filters.get('religion'):
-            query += ' AND "ReligiousCharacter (name)" = ?'
-            params.append(filters["religion"])
-    
-    query += ' GROUP BY "EstablishmentTypeGroup (name)" ORDER BY Count DESC'
+            with profile_scope(func.__name__):
+                result = func(*args, **kwargs)
+            payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+            cache.put(key, payload, version)
+            if PROFILING:
+                get_profiler().record("loader", func.__name__, time.perf_counter() - started, "miss", result_rows(result), len(payload))
+            return result
+        return wrapper
+    return decorator
+
+DB_PATH = os.environ.get("SCHOOLS_DB", "schools.db")
+
+# Read connections kept open for all sessions
+POOL_SIZE = int(os.environ.get("SCHOOLS_DB_POOL_SIZE", "8"))
+
+# Set SCHOOLS_DB_IMMUTABLE=1 only when the database file is never written while
+# the app runs (it is still picked up if replaced); SQLite then skips all locking
+DB_IMMUTABLE = os.environ.get("SCHOOLS_DB_IMMUTABLE") == "1"
+
+# Filters of the unfiltered landing view
+DEFAULT_FILTERS = {
+    'name': '',
+    'trust_name': '',
+    'la': '',
+    'establishment_groups': [],
+    'phase': '',
+    'postcode': '',
+    'gender': '',
+    'religion': '',
+    'near_postcode': '',
+    'radius_km': 5,
+    'show_all': False
+}
+
+log = logging.getLogger("schools_dashboard")
+
+class DataVersionMonitor:
+    """Tracks which version of the database is being served.
+
+    The version is metadata.last_updated. Each run only stats the database
+    files; the metadata row is re-read when they have changed. A new version
+    is served once its landing-page aggregates have been rebuilt in a
+    background thread, after which cache entries of older versions are
+    dropped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.signature = self._signature()
+        self.served = self._read_version()
+        self.pending = None
+        self.lock = threading.Lock()
+
+    def _signature(self):
+        # Covers in-place writes (WAL or rollback journal) and file replacement
+        signature = []
+        for path in (self.path, self.path + "-wal"):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _read_version(self):
+        # Use a fresh connection: the shared one may still hold a replaced file open
+        conn = sqlite3.connect(self.path)
+        try:
+            row = conn.execute("SELECT last_updated FROM metadata").fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        finally:
+            conn.close()
+        return str(row[0]) if row else str(self.signature)
+
+    def check(self):
+        """Cheap per-run check; returns the version to serve"""
+        signature = self._signature()
+        if signature == self.signature:
+            return self.served
+        
+        with self.lock:
+            previous = self.signature
+            replaced = signature[0] is None or self.signature[0] is None or signature[0][0] != self.signature[0][0]
+            self.signature = signature
+            version = self._read_version()
+            if version not in (self.served, self.pending):
+                self.pending = version
+                threading.Thread(target=self._switch, args=(version, replaced, previous), daemon=True).start()
+        return self.served
+
+    def _switch(self, version, replaced, previous):
+        try:
+            if replaced:
+                get_pool.clear()
+            
+            # Rebuild the landing view for the new version before serving it
+            _version_override.value = version
+            try:
+                load_dashboard_aggregates(normalize_filters(DEFAULT_FILTERS))
+            finally:
+                _version_override.value = None
+        except Exception:
+            # e.g. "database is locked" while ingest.py is still writing; keep
+            # serving the old version and retry on the next run
+            log.exception("Rebuild for data version %s failed", version)
+            with self.lock:
+                if self.pending == version:
+                    self.pending = None
+                    self.signature = previous
+            return
+        
+        with self.lock:
+            self.served = version
+            self.pending = None
+        for cache in _loader_caches().values():
+            cache.drop_stale(version)
+
+@st.cache_resource
+def get_data_monitor():
+    return DataVersionMonitor(DB_PATH)
+
+# Lets the background rebuild compute results for a version not yet served
+_version_override = threading.local()
+
+def data_version():
+    """Version of the data the current run is served from"""
+    return getattr(_version_override, 'value', None) or get_data_monitor().served
+
+# Indexes the dashboard's queries rely on, created on startup when missing.
+# The LA and type group indexes also carry the charted columns so the
+# aggregate query is answered from an index alone.
+SCHEMA_INDEXES = {
+    'idx_schools_urn': 'URN',
+    'idx_schools_trust': '"Trusts (name)"',
+    'idx_schools_la': '"LA (name)", "EstablishmentTypeGroup (name)", "PhaseOfEducation (name)", "ReligiousCharacter (name)", "Gender (name)"',
+    'idx_schools_group': '"EstablishmentTypeGroup (name)", "PhaseOfEducation (name)", "ReligiousCharacter (name)", "Gender (name)"',
+    'idx_schools_phase': '"PhaseOfEducation (name)"',
+    'idx_schools_gender': '"Gender (name)"',
+    'idx_schools_religion': '"ReligiousCharacter (name)"',
+    'idx_schools_name': 'EstablishmentName, URN',
+    # NOCASE so the case-insensitive "Postcode LIKE 'prefix%'" can use it
+    'idx_schools_postcode': 'Postcode COLLATE NOCASE'
+}
+
+def index_columns(conn):
+    """Name -> column tuple of the indexes on schools"""
+    return {
+        name: tuple(row[2] for row in conn.execute(f'PRAGMA index_info("{name}")'))
+        for _, name, *_ in conn.execute('PRAGMA index_list(schools)')
+    }
+
+def ensure_indexes(conn):
+    """Create any missing dashboard indexes and refresh planner statistics.
+
+    A dashboard index whose columns another index already covers (such as
+    the unique URN index ingest.py creates) is not created, or is dropped if
+    it was created before, so writes do not maintain two identical B-trees.
+    """
+    existing = index_columns(conn)
+    others = {columns for name, columns in existing.items() if name not in SCHEMA_INDEXES}
+    # Definitions with a COLLATE clause never match, as a BINARY index cannot serve them
+    redundant = {
+        name for name, definition in SCHEMA_INDEXES.items()
+        if tuple(column.strip().strip('"') for column in definition.split(',')) in others
+    }
+    missing = [name for name in SCHEMA_INDEXES if name not in existing and name not in redundant]
+    duplicates = [name for name in redundant if name in existing]
+    has_stats = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is not None
+    if not missing and not duplicates and has_stats:
+        return []
     
-    return pd.read_sql(query, conn, params=params)
+    try:
+        with conn:
+            for name in duplicates:
+                conn.execute(f'DROP INDEX IF EXISTS {name}')
+            for name in missing:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON schools({SCHEMA_INDEXES[name]})')
+            conn.execute('ANALYZE')
+    except sqlite3.OperationalError:
+        # Read-only deployments keep serving with whatever indexes exist
+        return []
+    return missing
 
-@st.cache_data
-def load_phase_summary(filters=None):
-    conn = get_connection()
+# Trigram full-text index over the name columns. It is an external-content
+# table reading from schools, kept in sync by triggers, so substring
+# searches on names no longer scan the table.
+SEARCH_INDEX_SCHEMA = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS schools_fts USING fts5(
+        EstablishmentName, "Trusts (name)",
+        content='schools', content_rowid='rowid', tokenize='trigram'
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS schools_fts_insert AFTER INSERT ON schools BEGIN
+        INSERT INTO schools_fts(rowid, EstablishmentName, "Trusts (name)")
+        VALUES (new.rowid, new.EstablishmentName, new."Trusts (name)");
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS schools_fts_delete AFTER DELETE ON schools BEGIN
+        INSERT INTO schools_fts(schools_fts, rowid, EstablishmentName, "Trusts (name)")
+        VALUES ('delete', old.rowid, old.EstablishmentName, old."Trusts (name)");
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS schools_fts_update AFTER UPDATE ON schools BEGIN
+        INSERT INTO schools_fts(schools_fts, rowid, EstablishmentName, "Trusts (name)")
+        VALUES ('delete', old.rowid, old.EstablishmentName, old."Trusts (name)");
+        INSERT INTO schools_fts(rowid, EstablishmentName, "Trusts (name)")
+        VALUES (new.rowid, new.EstablishmentName, new."Trusts (name)");
+    END'''
+]
+
+def ensure_search_index(conn):
+    """Create and populate the name search index if it is missing"""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE name LIKE 'schools_fts%'")}
+    if {'schools_fts', 'schools_fts_insert', 'schools_fts_delete', 'schools_fts_update'} <= existing:
+        return True
+    
+    try:
+        with conn:
+            # Triggers vanish when the schools table is replaced, so rebuild from scratch
+            conn.execute('DROP TABLE IF EXISTS schools_fts')
+            for statement in SEARCH_INDEX_SCHEMA:
+                conn.execute(statement)
+            conn.execute("INSERT INTO schools_fts(schools_fts) VALUES ('rebuild')")
+    except sqlite3.OperationalError:
+        # Read-only database or an SQLite build without FTS5 trigram support
+        return False
+    return True
+
+class ConnectionPool:
+    """Fixed-size pool of read-only SQLite connections shared by every session.
+
+    Each Streamlit session runs its reruns in its own thread, so sessions check
+    out a connection per query instead of serialising on a single shared one.
+    Connections are opened lazily up to the pool size; when all are busy,
+    callers wait, and the waits are counted for the diagnostics panel.
+    """
+
+    def __init__(self, path, size, immutable=False, search_index=False):
+        self.uri = Path(path).resolve().as_uri() + "?mode=ro" + ("&immutable=1" if immutable else "")
+        self.size = size
+        self.search_index = search_index
+        # LIFO so the most recently used connections, with warm page caches, are reused first
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        # Compiled filters give a bounded set of distinct statements to keep prepared
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute("PRAGMA mmap_size = 268435456")
+        conn.execute("PRAGMA cache_size = -16384")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.create_function("distance_km", 4, sql_distance_km, deterministic=True)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        started = time.perf_counter()
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_open = self.opened < self.size
+                if can_open:
+                    self.opened += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except sqlite3.Error:
+                    with self.lock:
+                        self.opened -= 1
+                    raise
+            else:
+                conn = self.idle.get()
+        waited = time.perf_counter() - started
+        
+        with self.lock:
+            self.checkouts += 1
+            if waited > 0.001:
+                self.waits += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        try:
+            yield conn
+        finally:
+            self.idle.put(conn)
+
+    def stats(self):
+        return {
+            "pool_size": self.size,
+            "open": self.opened,
+            "idle": self.idle.qsize(),
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "total_wait_ms": round(self.wait_seconds * 1000, 1),
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 1)
+        }
+
+def prepare_database(path):
+    """One-off writable pass creating missing indexes and the search index"""
+    conn = sqlite3.connect(path)
+    try:
+        ensure_indexes(conn)
+        return ensure_search_index(conn)
+    finally:
+        conn.close()
+
+# Database connection
+@st.cache_resource
+def get_pool():
+    search_index = prepare_database(DB_PATH)
+    return ConnectionPool(DB_PATH, POOL_SIZE, immutable=DB_IMMUTABLE, search_index=search_index)
+
+def get_connection():
+    """Check out a pooled read-only connection, as `with get_connection() as conn:`"""
+    return get_pool().connection()
+
+def search_index_available():
+    return get_pool().search_index
+
+# Worker threads for the independent queries of a rerun, one per pooled connection
+@st.cache_resource
+def get_query_executor():
+    return ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="dashboard-query")
+
+def load_concurrently(**loaders):
+    """Run independent loaders on the query threads and wait for all of them.
+
+    Takes name=callable pairs and returns a dict of their results, so the
+    rerun waits for the slowest query rather than the sum of all of them.
+    """
+    ctx = get_script_run_ctx()
     
-    query = '''
-        SELECT "PhaseOfEducation (name)" as PhaseOfEducation, 
-               COUNT(*) as Count
-        FROM schools
-        WHERE 1=1
-    '''
-    params = []
+    def run(loader):
+        # Let cached resources and warnings resolve against the calling session
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return loader()
     
-    if filters:
-        if filters.get('name'):
-            query += ' AND EstablishmentName LIKE ?'
-            params.append(f'%{filters["name"]}%')
-            
-        if filters.get('trust_name'):
-            query += ' AND "Trusts (name)" LIKE ?'
-            params.append(f'%{filters["trust_name"]}%')
-        
-        if filters.get('la'):
-            query += ' AND "LA (name)" = ?'
-            params.append(filters["la"])
+    executor = get_query_executor()
+    futures = {name: executor.submit(run, loader) for name, loader in loaders.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+def fts_phrase(text):
+    # Quote as an FTS5 phrase; with the trigram tokenizer a phrase is a substring match
+    return '"' + text.replace('"', '""') + '"'
+
+def name_match_clause(column, term, search_index):
+    """Case-insensitive substring filter on a name column, via the search index where possible"""
+    # Trigrams need at least three characters; shorter terms fall back to LIKE
+    if len(term) >= 3 and search_index:
+        return f' AND rowid IN (SELECT rowid FROM schools_fts WHERE "{column}" MATCH ?)', [fts_phrase(term)]
+    return f' AND "{column}" LIKE ?', [f'%{term}%']
+
+class QueryLog:
+    """Most recent distinct queries, for the query plan diagnostics"""
+
+    def __init__(self, limit=50):
+        self.limit = limit
+        self.queries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def record(self, query, params):
+        with self.lock:
+            self.queries[query] = list(params or [])
+            self.queries.move_to_end(query)
+            while len(self.queries) > self.limit:
+                self.queries.popitem(last=False)
+
+    def recent(self):
+        with self.lock:
+            return list(reversed(self.queries.items()))
+
+@st.cache_resource
+def _query_log():
+    return QueryLog()
+
+def read_sql(query, params=None, chunksize=None):
+    """Run a query on a pooled connection, remembering it for the diagnostics view"""
+    _query_log().record(query, params)
+    
+    if chunksize is not None:
+        return _read_sql_chunks(query, params, chunksize)
+    started = time.perf_counter()
+    with get_connection() as conn:
+        rows = pd.read_sql(query, conn, params=params)
+    if PROFILING:
+        # Includes waiting for a pooled connection and building the DataFrame
+        scope = getattr(_profile_scope, "name", None) or "read_sql"
+        get_profiler().record("query", scope, time.perf_counter() - started, rows=len(rows))
+    return rows
+
+def _read_sql_chunks(query, params, chunksize):
+    # Holds its connection until the last chunk has been read
+    with get_connection() as conn:
+        yield from pd.read_sql(query, conn, params=params, chunksize=chunksize)
+
+def explain_recent_queries():
+    """EXPLAIN QUERY PLAN for every recently issued query"""
+    plans = []
+    for query, params in _query_log().recent():
+        with get_connection() as conn:
+            steps = conn.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()
+        details = [step[3] for step in steps]
+        # A bare "SCAN schools" walks the whole table without an index
+        full_scan = any(detail.strip() == 'SCAN schools' for detail in details)
+        plans.append({"query": query, "params": params, "plan": details, "full_scan": full_scan})
+    return plans
+
+# Filter engine: "sql" sends every filter combination to SQLite, "memory" answers
+# filters and chart counts from the in-memory bitmap index below
+FILTER_ENGINE = os.environ.get("SCHOOLS_FILTER_ENGINE", "sql")
+
+# Low-cardinality filter columns held in the in-memory index
+INDEXED_COLUMNS = {
+    'la': 'LA (name)',
+    'establishment_groups': 'EstablishmentTypeGroup (name)',
+    'phase': 'PhaseOfEducation (name)',
+    'gender': 'Gender (name)',
+    'religion': 'ReligiousCharacter (name)'
+}
+
+class SchoolFilterIndex:
+    """Dictionary-encoded filter columns with one bitmap per distinct value.
+
+    Rows are held in list order (EstablishmentName, URN), so bit i of every
+    bitmap is the i-th school of the school list and a page of results is a
+    slice of the set bits. Bitmaps are Python ints, so combining filters is a
+    bitwise AND and counting matches is a popcount.
+    """
+
+    def __init__(self):
+        columns = ', '.join(f'"{column}"' for column in INDEXED_COLUMNS.values())
+        rows = read_sql(
+            f'SELECT URN, EstablishmentName, "Trusts (name)", Postcode, {columns} '
+            'FROM schools ORDER BY EstablishmentName, URN'
+        )
+        self.size = len(rows)
+        self.all_rows = (1 << self.size) - 1
+        self.urns = rows['URN'].to_numpy()
         
-        # Using establishment_groups instead of school_types
-        if filters.get('establishment_groups') and len(filters["establishment_groups"]) > 0:
-            placeholders = ', '.join(['?' for _ in filters["establishment_groups"]])
-            query += f' AND "EstablishmentTypeGroup (name)" IN ({placeholders})'
-            params.extend(filters["establishment_groups"])
+        self.bitmaps = {}
+        for column in INDEXED_COLUMNS.values():
+            codes, values = pd.factorize(rows[column], use_na_sentinel=False)
+            self.bitmaps[column] = {
+                (None if pd.isna(value) else value): self._to_bitmap(codes == code)
+                for code, value in enumerate(values)
+            }
         
-        if filters.get('phase'):
-            query += ' AND "PhaseOfEducation (name)" = ?'
-            params.append(filters["phase"])
+        # Lowercased copies of the free-text columns for the substring/prefix filters
+        self.text = {
+            column: rows[column].str.lower()
+            for column in ('EstablishmentName', 'Trusts (name)', 'Postcode')
+        }
         
-        # Keep the original postcode filter
-        if filters.get('postcode'):
-            query += ' AND Postcode LIKE ?'
-            params.append(f'{filters["postcode"]}%')
-            
-        if filters.get('gender'):
-            query += ' AND "Gender (name)" = ?'
-            params.append(filters["gender"])
-            
-        if filters.get('religion'):
-            query += ' AND "ReligiousCharacter (name)" = ?'
-            params.append(filters["religion"])
-    
-    query += ' GROUP BY "PhaseOfEducation (name)" ORDER BY Count DESC'
-    
-    return pd.read_sql(query, conn, params=params)
+        # Postcode centroids for the radius search (NaN where a school has none)
+        self.lat = np.full(self.size, np.nan)
+        self.lon = np.full(self.size, np.nan)
+        if locations_available():
+            locations = read_sql("SELECT urn, lat, lon FROM school_locations").set_index('urn')
+            self.lat = rows['URN'].map(locations['lat']).to_numpy(dtype=float)
+            self.lon = rows['URN'].map(locations['lon']).to_numpy(dtype=float)
 
-@st.cache_data
-def load_religion_summary(filters=None):
-    conn = get_connection()
-    
-    query = '''
-        SELECT "ReligiousCharacter (name)" as ReligiousCharacter, 
-               COUNT(*) as Count
-        FROM schools
-        WHERE "ReligiousCharacter (name)" != 'Unknown'
-    '''
-    params = []
-    
-    if filters:
+    def _to_bitmap(self, flags):
+        return int.from_bytes(np.packbits(flags, bitorder='little').tobytes(), 'little')
+
+    def positions(self, bitmap):
+        """Row positions of the set bits, in list order"""
+        if self.size == 0:
+            return np.array([], dtype=np.int64)
+        packed = np.frombuffer(bitmap.to_bytes((self.size + 7) // 8, 'little'), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(packed, bitorder='little')[:self.size])
+
+    def _match_text(self, mask, column, predicate):
+        # Only test the rows that survived the categorical filters
+        candidates = self.positions(mask)
+        matched = predicate(self.text[column].iloc[candidates]).fillna(False).to_numpy(dtype=bool)
+        flags = np.zeros(self.size, dtype=bool)
+        flags[candidates[matched]] = True
+        return mask & self._to_bitmap(flags)
+
+    def selection(self, key, selected):
+        """Bitmap of the rows matching one indexed filter (every row when it is unset)"""
+        if not selected:
+            return self.all_rows
+        column = INDEXED_COLUMNS[key]
+        if isinstance(selected, (list, tuple)):
+            union = 0
+            for value in selected:
+                union |= self.bitmaps[column].get(value, 0)
+            return union
+        return self.bitmaps[column].get(selected, 0)
+
+    def distances(self, positions, origin):
+        """Distance in km from origin to the schools at the given positions"""
+        return distance_km(self.lat[positions], self.lon[positions], origin[0], origin[1])
+
+    def _within(self, mask, postcode, km):
+        origin = postcode_location(postcode)
+        if origin is None:
+            return 0
+        candidates = self.positions(mask)
+        flags = np.zeros(self.size, dtype=bool)
+        flags[candidates[self.distances(candidates, origin) <= km]] = True
+        return mask & self._to_bitmap(flags)
+
+    def mask(self, filters=None):
+        """Bitmap of the rows matching the filters"""
+        mask = self.all_rows
+        if not filters:
+            return mask
+        
+        for key in INDEXED_COLUMNS:
+            mask &= self.selection(key, filters.get(key))
+        
         if filters.get('name'):
-            query += ' AND EstablishmentName LIKE ?'
-            params.append(f'%{filters["name"]}%')
-            
+            term = filters['name'].lower()
+            mask = self._match_text(mask, 'EstablishmentName', lambda s: s.str.contains(term, regex=False))
+        
         if filters.get('trust_name'):
-            query += ' AND "Trusts (name)" LIKE ?'
-            params.append(f'%{filters["trust_name"]}%')
+            term = filters['trust_name'].lower()
+            mask = self._match_text(mask, 'Trusts (name)', lambda s: s.str.contains(term, regex=False))
         
-        if filters.get('la'):
-            query += ' AND "LA (name)" = ?'
-            params.append(filters["la"])
+        if filters.get('postcode'):
+            prefix = filters['postcode'].lower()
+            mask = self._match_text(mask, 'Postcode', lambda s: s.str.startswith(prefix))
         
-        # Using establishment_groups instead of school_types
-        if filters.get('establishment_groups') and len(filters["establishment_groups"]) > 0:
-            placeholders = ', '.join(['?' for _ in filters["establishment_groups"]])
-            query += f' AND "EstablishmentTypeGroup (name)" IN ({placeholders})'
-            params.extend(filters["establishment_groups"])
+        if filters.get('near'):
+            mask = self._within(mask, *filters['near'])
         
-        if filters.get('phase'):
-            query += ' AND "PhaseOfEducation (name)" = ?'
-            params.append(filters["phase"])
+        return mask
+
+    def count_by(self, mask, column):
+        """Number of matching rows for each value of a column"""
+        counts = {}
+        for value, bitmap in self.bitmaps[column].items():
+            count = (mask & bitmap).bit_count()
+            if count:
+                counts[value] = count
+        return counts
+
+    def facet_counts(self, filters=None):
+        """Matching rows per value of every indexed column, each ignoring its own filter"""
+        filters = filters or {}
+        unindexed = {key: filters[key] for key in ('name', 'trust_name', 'postcode', 'near') if filters.get(key)}
+        base = self.mask(unindexed)
+        selections = {key: self.selection(key, filters.get(key)) for key in INDEXED_COLUMNS}
         
-        # Keep the original postcode filter
-        if filters.get('postcode'):
-            query += ' AND Postcode LIKE ?'
-            params.append(f'{filters["postcode"]}%')
-            
-        if filters.get('gender'):
-            query += ' AND "Gender (name)" = ?'
-            params.append(filters["gender"])
-            
-        if filters.get('religion'):
-            query += ' AND "ReligiousCharacter (name)" = ?'
-            params.append(filters["religion"])
+        facets = {}
+        for key, column in INDEXED_COLUMNS.items():
+            mask = base
+            for other, bitmap in selections.items():
+                if other != key:
+                    mask &= bitmap
+            facets[key] = {value: count for value, count in self.count_by(mask, column).items() if value is not None}
+        return facets
+
+# One index per data version; the previous version is dropped
+@st.cache_resource(max_entries=2)
+def get_filter_index(version):
+    return SchoolFilterIndex()
+
+# Columns each view renders. Queries select only these instead of every
+# GIAS column; list and trust views map them to their display headers.
+LIST_COLUMNS = {
+    'URN': 'URN',
+    'EstablishmentName': 'School Name',
+    'LA (name)': 'Local Authority',
+    'TypeOfEstablishment (name)': 'Type',
+    'PhaseOfEducation (name)': 'Phase',
+    'Trusts (name)': 'Trust',
+    'Gender (name)': 'Gender',
+    'ReligiousCharacter (name)': 'Religious Character',
+    'Postcode': 'Postcode'
+}
+
+TRUST_COLUMNS = {column: header for column, header in LIST_COLUMNS.items() if column != 'Trusts (name)'}
+
+# The wide fetch, used only for the school details tabs and infographic
+DETAIL_COLUMNS = [
+    'URN', 'EstablishmentName', 'TypeOfEstablishment (name)', 'EstablishmentTypeGroup (name)',
+    'PhaseOfEducation (name)', 'LA (name)', 'Gender (name)', 'ReligiousCharacter (name)',
+    'FullAddress', 'Postcode', 'TelephoneNum', 'SchoolWebsite', 'HeadTeacherFullName', 'HeadPreferredJobTitle',
+    'SchoolCapacity', 'NumberOfPupils', 'PercentageFSM', 'StatutoryLowAge', 'StatutoryHighAge',
+    'NurseryProvision (name)', 'OfficialSixthForm (name)', 'Trusts (name)', 'Federations (name)',
+    'DistrictAdministrative (name)', 'AdministrativeWard (name)', 'ParliamentaryConstituency (name)',
+    'UrbanRural (name)'
+]
+
+def select_list(columns):
+    """Quoted SELECT list for a column projection"""
+    return ', '.join(f'"{column}"' for column in columns)
+
+def fetch_schools_by_urn(urns, columns=LIST_COLUMNS):
+    """Fetch school rows for the given URNs, keeping their order"""
+    urns = [int(urn) for urn in urns]
+    if not urns:
+        return read_sql(f"SELECT {select_list(columns)} FROM schools WHERE 0")
+    
+    # Stay well below SQLite's bound-parameter limit
+    chunks = []
+    for start in range(0, len(urns), 500):
+        chunk = urns[start:start + 500]
+        placeholders = ', '.join(['?' for _ in chunk])
+        chunks.append(read_sql(f"SELECT {select_list(columns)} FROM schools WHERE URN IN ({placeholders})", params=chunk))
+    
+    rows = pd.concat(chunks, ignore_index=True)
+    order = {urn: position for position, urn in enumerate(urns)}
+    return rows.sort_values('URN', key=lambda urn: urn.map(order)).reset_index(drop=True)
+
+# Load data with caching
+@cached_loader(max_mb=1)
+def load_metadata():
+    metadata = read_sql("SELECT * FROM metadata")
+    return metadata.iloc[0]
+
+EARTH_RADIUS_KM = 6371.0088
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance in km; works on scalars and numpy arrays"""
+    lat1, lon1, lat2, lon2 = np.radians(lat1), np.radians(lon1), np.radians(lat2), np.radians(lon2)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+def sql_distance_km(lat1, lon1, lat2, lon2):
+    # distance_km() as registered on every pooled connection
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+    return float(distance_km(lat1, lon1, lat2, lon2))
+
+def bounding_box(lat, lon, km):
+    """(min_lat, max_lat, min_lon, max_lon) of a box enclosing the circle of radius km"""
+    dlat = np.degrees(km / EARTH_RADIUS_KM)
+    dlon = np.degrees(np.arcsin(min(1.0, np.sin(km / EARTH_RADIUS_KM) / np.cos(np.radians(lat)))))
+    return float(lat - dlat), float(lat + dlat), float(lon - dlon), float(lon + dlon)
+
+FULL_POSTCODE = re.compile(r'^([A-Z]{1,2}[0-9][A-Z0-9]?)([0-9][A-Z]{2})$')
+
+def format_postcode(text):
+    """Upper-case a postcode or postcode prefix with single spaces, as GIAS and ONSPD store them.
+
+    A full postcode typed without its space ("sw1a1aa") gets it back ("SW1A 1AA").
+    """
+    text = ' '.join((text or '').upper().split())
+    match = FULL_POSTCODE.match(text.replace(' ', ''))
+    return f'{match.group(1)} {match.group(2)}' if match else text
+
+@cached_loader(max_mb=1)
+def locations_available():
+    """Whether ingest.py has built the school_locations spatial index"""
+    return bool(read_sql("SELECT COUNT(*) FROM sqlite_master WHERE name = 'school_locations'").iloc[0, 0])
+
+@cached_loader(max_mb=1, ttl=6 * 3600)
+def postcode_location(postcode):
+    """(lat, lon) centroid of a full postcode, or None when it is unknown"""
+    if not locations_available():
+        return None
+    rows = read_sql("SELECT lat, lon FROM postcodes WHERE postcode = ?", params=[format_postcode(postcode)])
+    return None if rows.empty else (float(rows.iloc[0, 0]), float(rows.iloc[0, 1]))
+
+# Filters that narrow the school set, in the order their predicates are emitted
+# (show_all only changes how the list is displayed). "near" is the radius search
+# built from the near_postcode and radius_km entries of the filters dict.
+FILTER_KEYS = ('name', 'trust_name', 'la', 'establishment_groups', 'phase', 'postcode', 'gender', 'religion', 'near')
+
+def normalize_filters(filters):
+    """Canonical, hashable form of a filters dict, used as the cache key for every loader.
+
+    Whitespace is trimmed and collapsed, the case-insensitive name and postcode
+    searches are case-folded, empty values and None are dropped and the group
+    list is sorted and de-duplicated. Filter sets that only differ cosmetically
+    therefore share cache entries and the exact same SQL text.
+    """
+    if isinstance(filters, tuple):
+        return filters
+    
+    filters = filters or {}
+    normalized = []
+    for key in FILTER_KEYS:
+        if key == 'near':
+            postcode = format_postcode(filters.get('near_postcode'))
+            radius = float(filters.get('radius_km') or DEFAULT_FILTERS['radius_km'])
+            value = (postcode, radius) if postcode else None
+        else:
+            value = filters.get(key)
+        if not value:
+            continue
+        if key == 'establishment_groups':
+            value = tuple(sorted({' '.join(group.split()) for group in value if group and group.strip()}))
+        elif key == 'postcode':
+            value = format_postcode(value)
+        elif key != 'near':
+            value = ' '.join(value.split())
+            if key in ('name', 'trust_name'):
+                value = value.lower()
+        if value:
+            normalized.append((key, value))
+    return tuple(normalized)
+
+# search_index is part of the cache key: the database behind the pool may be
+# replaced by one without the search index
+@functools.lru_cache(maxsize=256)
+def _compile_filters(normalized, origin, search_index):
+    clause = ''
+    params = []
     
-    query += ' GROUP BY "ReligiousCharacter (name)" ORDER BY Count DESC'
+    for key, value in normalized:
+        if key in ('name', 'trust_name'):
+            # Substring match, answered by the trigram search index where possible
+            column = 'EstablishmentName' if key == 'name' else 'Trusts (name)'
+            name_clause, name_params = name_match_clause(column, value, search_index)
+            clause += name_clause
+            params.extend(name_params)
+        elif key == 'establishment_groups':
+            placeholders = ', '.join(['?' for _ in value])
+            clause += f' AND "EstablishmentTypeGroup (name)" IN ({placeholders})'
+            params.extend(value)
+        elif key == 'postcode':
+            clause += ' AND Postcode LIKE ?'
+            params.append(f'{value}%')
+        elif key == 'near':
+            if origin is None:
+                # Unknown postcode, or no postcode centroids loaded
+                clause += ' AND 0'
+                continue
+            # The R*Tree narrows the candidates to a bounding box, the exact
+            # distance check is only run inside it
+            lat, lon = origin
+            min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, value[1])
+            clause += (
+                ' AND URN IN (SELECT urn FROM school_locations'
+                ' WHERE min_lat <= ? AND max_lat >= ? AND min_lon <= ? AND max_lon >= ?'
+                ' AND distance_km(lat, lon, ?, ?) <= ?)'
+            )
+            params.extend([max_lat, min_lat, max_lon, min_lon, lat, lon, value[1]])
+        else:
+            clause += f' AND "{INDEXED_COLUMNS[key]}" = ?'
+            params.append(value)
     
-    return pd.read_sql(query, conn, params=params)
+    return clause, tuple(params)
 
-@st.cache_data
-def load_gender_summary(filters=None):
-    conn = get_connection()
-    
-    query = '''
-        SELECT "Gender (name)" as Gender, 
+def compile_filters(filters):
+    """WHERE clause fragment and parameters for a filter set.
+
+    The same filter shape always compiles to the same SQL text, so sqlite3's
+    statement cache is reused across loaders and reruns.
+    """
+    normalized = normalize_filters(filters)
+    near = dict(normalized).get('near')
+    origin = postcode_location(near[0]) if near else None
+    clause, params = _compile_filters(normalized, origin, search_index_available())
+    return clause, list(params)
+
+def _count_by(cube, column, exclude=None):
+    """Roll the aggregate cube up to counts for a single column"""
+    if exclude is not None:
+        cube = cube[cube[column].notna() & (cube[column] != exclude)]
+    summary = cube.groupby(column, as_index=False, dropna=False)['Count'].sum()
+    return summary.sort_values('Count', ascending=False, kind='stable').reset_index(drop=True)
+
+def _summary_frame(counts, label, exclude=None):
+    """Turn a value -> count mapping into a chart summary frame"""
+    rows = [(value, count) for value, count in counts.items() if value is not None and value != exclude]
+    if exclude is None and None in counts:
+        rows.append((None, counts[None]))
+    summary = pd.DataFrame(rows, columns=[label, 'Count'])
+    return summary.sort_values('Count', ascending=False, kind='stable').reset_index(drop=True)
+
+def _aggregates_from_index(index, filters):
+    mask = index.mask(filters)
+    phase_bitmaps = index.bitmaps['PhaseOfEducation (name)']
+    return {
+        "school_types": _summary_frame(index.count_by(mask, 'EstablishmentTypeGroup (name)'), 'EstablishmentTypeGroup'),
+        "phase_summary": _summary_frame(index.count_by(mask, 'PhaseOfEducation (name)'), 'PhaseOfEducation'),
+        "religion_summary": _summary_frame(index.count_by(mask, 'ReligiousCharacter (name)'), 'ReligiousCharacter', exclude='Unknown'),
+        "gender_summary": _summary_frame(index.count_by(mask, 'Gender (name)'), 'Gender', exclude='Unknown'),
+        "stats": {
+            "total": mask.bit_count(),
+            "primary": (mask & phase_bitmaps.get('Primary', 0)).bit_count(),
+            "secondary": (mask & phase_bitmaps.get('Secondary', 0)).bit_count()
+        }
+    }
+
+def _matches_rollup(filters):
+    # The precomputed rollups cover the unfiltered view and single-LA views
+    return all(key == 'la' for key, _ in normalize_filters(filters))
+
+def _aggregates_from_rollups(la):
+    """Dashboard aggregates read from the summary_rollups table built by ingest.py"""
+    rows = read_sql("SELECT dimension, value, count FROM summary_rollups WHERE la = ?", params=[la])
+    counts = {dimension: {} for dimension in ('EstablishmentTypeGroup', 'PhaseOfEducation', 'ReligiousCharacter', 'Gender')}
+    for dimension, value, count in rows.itertuples(index=False, name=None):
+        counts[dimension][value] = int(count)
+    
+    phases = counts['PhaseOfEducation']
+    return {
+        "school_types": _summary_frame(counts['EstablishmentTypeGroup'], 'EstablishmentTypeGroup'),
+        "phase_summary": _summary_frame(phases, 'PhaseOfEducation'),
+        "religion_summary": _summary_frame(counts['ReligiousCharacter'], 'ReligiousCharacter', exclude='Unknown'),
+        "gender_summary": _summary_frame(counts['Gender'], 'Gender', exclude='Unknown'),
+        "stats": {
+            "total": sum(phases.values()),
+            "primary": phases.get('Primary', 0),
+            "secondary": phases.get('Secondary', 0)
+        }
+    }
+
+def rollups_available():
+    return read_sql("SELECT COUNT(*) FROM sqlite_master WHERE name = 'summary_rollups'").iloc[0, 0] > 0
+
+@cached_loader(max_mb=16, ttl=6 * 3600)
+def load_dashboard_aggregates(filters=None):
+    """Count the filtered schools by type group, phase, religion and gender in one pass"""
+    if FILTER_ENGINE == "memory":
+        return _aggregates_from_index(get_filter_index(data_version()), dict(normalize_filters(filters)))
+    
+    # Landing-page and LA-only views read a few dozen precomputed rows
+    if _matches_rollup(filters) and rollups_available():
+        return _aggregates_from_rollups(dict(normalize_filters(filters)).get('la', ''))
+    
+    # Group by every charted column at once so the table is scanned a single time;
+    # the per-chart summaries and headline metrics are rolled up from this cube
+    clause, params = compile_filters(filters)
+    query = f'''
+        SELECT "EstablishmentTypeGroup (name)" as EstablishmentTypeGroup,
+               "PhaseOfEducation (name)" as PhaseOfEducation,
+               "ReligiousCharacter (name)" as ReligiousCharacter,
+               "Gender (name)" as Gender,
                COUNT(*) as Count
         FROM schools
-        WHERE "Gender (name)" != 'Unknown'
+        WHERE 1=1{clause}
+        GROUP BY 1, 2, 3, 4
     '''
-    params = []
+    cube = read_sql(query, params=params)
     
-    if filters:
-        if filters.get('name'):
-            query += ' AND EstablishmentName LIKE ?'
-            params.append(f'%{filters["name"]}%')
-            
-        if filters.get('trust_name'):
-            query += ' AND "Trusts (name)" LIKE ?'
-            params.append(f'%{filters["trust_name"]}%')
-        
-        if filters.get('la'):
-            query += ' AND "LA (name)" = ?'
-            params.append(filters["la"])
-        
-        # Using establishment_groups instead of school_types
-        if filters.get('establishment_groups') and len(filters["establishment_groups"]) > 0:
-            placeholders = ', '.join(['?' for _ in filters["establishment_groups"]])
-            query += f' AND "EstablishmentTypeGroup (name)" IN ({placeholders})'
-            params.extend(filters["establishment_groups"])
+    phases = cube['PhaseOfEducation']
+    return {
+        "school_types": _count_by(cube, 'EstablishmentTypeGroup'),
+        "phase_summary": _count_by(cube, 'PhaseOfEducation'),
+        "religion_summary": _count_by(cube, 'ReligiousCharacter', exclude='Unknown'),
+        "gender_summary": _count_by(cube, 'Gender', exclude='Unknown'),
+        "stats": {
+            "total": int(cube['Count'].sum()),
+            "primary": int(cube.loc[phases == 'Primary', 'Count'].sum()),
+            "secondary": int(cube.loc[phases == 'Secondary', 'Count'].sum())
+        }
+    }
+
+def load_school_types(filters=None):
+    return load_dashboard_aggregates(filters)["school_types"]
+
+def load_phase_summary(filters=None):
+    return load_dashboard_aggregates(filters)["phase_summary"]
+
+def load_religion_summary(filters=None):
+    return load_dashboard_aggregates(filters)["religion_summary"]
+
+def load_gender_summary(filters=None):
+    return load_dashboard_aggregates(filters)["gender_summary"]
+
+def catalog_available():
+    return read_sql("SELECT COUNT(*) FROM sqlite_master WHERE name = 'dimension_catalog'").iloc[0, 0] > 0
+
+# Sidebar filter columns, each listed with its values and school counts
+CATALOG_COLUMNS = list(INDEXED_COLUMNS.values()) + ['Trusts (name)']
+
+@cached_loader(max_mb=4)
+def load_dimension_catalog():
+    """Distinct values and school counts of every sidebar filter column.
+
+    Read from the dimension_catalog table built by ingest.py, or collected in a
+    single scan of older databases. Maps each column to a frame of its values
+    (Unknown excluded) and their Count, in value order.
+    """
+    if catalog_available():
+        rows = read_sql("SELECT dimension, value, count FROM dimension_catalog")
+    else:
+        selected = ", ".join(f'"{column}"' for column in CATALOG_COLUMNS)
+        cube = read_sql(f"SELECT {selected}, COUNT(*) AS count FROM schools GROUP BY {selected}")
+        rows = pd.concat(
+            cube.groupby(column)['count'].sum().rename_axis('value').reset_index().assign(dimension=column)
+            for column in CATALOG_COLUMNS
+        )
+    
+    catalog = {}
+    for column in CATALOG_COLUMNS:
+        values = rows[(rows['dimension'] == column) & rows['value'].notna() & (rows['value'] != 'Unknown')]
+        catalog[column] = pd.DataFrame({
+            column: values['value'].tolist(),
+            'Count': values['count'].astype(int).tolist()
+        }).sort_values(column, ignore_index=True)
+    return catalog
+
+@cached_loader(max_mb=4, ttl=6 * 3600)
+def _facet_cube(filters, keys):
+    """Filtered school counts grouped by the given facet columns"""
+    clause, params = compile_filters(filters)
+    columns = ", ".join(f'"{INDEXED_COLUMNS[key]}"' for key in keys)
+    return read_sql(f"SELECT {columns}, COUNT(*) AS Count FROM schools WHERE 1=1{clause} GROUP BY {columns}", params=params)
+
+@cached_loader(max_mb=4, ttl=6 * 3600)
+def load_facet_counts(filters=None):
+    """Matching schools per option of every sidebar facet, given the other active filters.
+
+    Each facet ignores its own selection, so its counts are what picking another
+    option would return. The memory engine intersects bitmaps. In SQL, facets
+    without a selection share one grouped query and each selected facet gets
+    its own, cached separately so it is reused while other filters change.
+    Returns {filter key: {value: count}} without zero counts.
+    """
+    filters = normalize_filters(filters)
+    if FILTER_ENGINE == "memory":
+        return get_filter_index(data_version()).facet_counts(dict(filters))
+    
+    active = dict(filters)
+    idle = tuple(key for key in INDEXED_COLUMNS if key not in active)
+    facets = {}
+    if idle:
+        cube = _facet_cube(filters, idle)
+        for key in idle:
+            facets[key] = cube.groupby(INDEXED_COLUMNS[key])['Count'].sum().astype(int).to_dict()
+    for key in active:
+        if key in INDEXED_COLUMNS:
+            others = tuple(item for item in filters if item[0] != key)
+            cube = _facet_cube(others, (key,))
+            facets[key] = cube.groupby(INDEXED_COLUMNS[key])['Count'].sum().astype(int).to_dict()
+    return {key: facets[key] for key in INDEXED_COLUMNS}
+
+def facet_options(catalog, counts, column, keep=()):
+    """Catalog values of a column that match at least one school, plus any current selection"""
+    return [value for value in catalog[column][column] if counts.get(value) or value in keep]
+
+def option_label(counts):
+    """format_func showing a sidebar option with its number of matching schools"""
+    return lambda value: f"{value} ({counts.get(value, 0):,})" if value else value
+
+@cached_loader(max_mb=8)
+def load_all_school_names():
+    return read_sql("SELECT DISTINCT EstablishmentName FROM schools ORDER BY EstablishmentName")
+
+def _trigrams(text):
+    padded = f' {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SuggestionIndex:
+    """Lowercase trigram inverted index over a list of names for "Did you mean" suggestions.
+
+    Candidates are the names sharing the most trigrams with the search term;
+    only those are scored with fuzzywuzzy, so a lookup touches a few posting
+    lists instead of every name.
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.lowered = [name.lower() for name in self.names]
+        postings = {}
+        for position, name in enumerate(self.lowered):
+            for gram in _trigrams(name):
+                postings.setdefault(gram, []).append(position)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def suggest(self, search_term, limit=5, candidates=100):
+        term = search_term.strip().lower()
+        lists = [self.postings[gram] for gram in _trigrams(term) if gram in self.postings]
+        if not term or not lists:
+            return []
         
-        if filters.get('phase'):
-            query += ' AND "PhaseOfEducation (name)" = ?'
-            params.append(filters["phase"])
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.names))
+        matched = np.flatnonzero(shared)
+        if len(matched) > candidates:
+            matched = matched[np.argpartition(shared[matched], -candidates)[-candidates:]]
         
-        # Keep the original postcode filter
-        if filters.get('postcode'):
-            query += ' AND Postcode LIKE ?'
-            params.append(f'{filters["postcode"]}%')
-            
-        if filters.get('gender'):
-            query += ' AND "Gender (name)" = ?'
-            params.append(filters["gender"])
-            
-        if filters.get('religion'):
-            query += ' AND "ReligiousCharacter (name)" = ?'
-            params.append(filters["religion"])
-    
-    query += ' GROUP BY "Gender (name)" ORDER BY Count DESC'
-    
-    return pd.read_sql(query, conn, params=params)
-
-@st.cache_data
-def load_local_authorities():
-    conn = get_connection()
-    return pd.read_sql("SELECT DISTINCT \"LA (name)\" FROM schools WHERE \"LA (name)\" != 'Unknown' ORDER BY \"LA (name)\"", conn)
-
-@st.cache_data
-def load_establishment_types():
-    conn = get_connection()
-    return pd.read_sql("SELECT DISTINCT \"TypeOfEstablishment (name)\" FROM schools WHERE \"TypeOfEstablishment (name)\" != 'Unknown' ORDER BY \"TypeOfEstablishment (name)\"", conn)
-
-# New function to load establishment type groups (from updated_app.py)
-@st.cache_data
-def load_establishment_groups():
-    conn = get_connection()
-    return pd.read_sql("SELECT DISTINCT \"EstablishmentTypeGroup (name)\" FROM schools WHERE \"EstablishmentTypeGroup (name)\" != 'Unknown' ORDER BY \"EstablishmentTypeGroup (name)\"", conn)
-
-@st.cache_data
-def load_phases():
-    conn = get_connection()
-    return pd.read_sql("SELECT DISTINCT \"PhaseOfEducation (name)\" FROM schools WHERE \"PhaseOfEducation (name)\" != 'Unknown' ORDER BY \"PhaseOfEducation (name)\"", conn)
-
-@st.cache_data
-def load_trusts():
-    conn = get_connection()
-    return pd.read_sql("SELECT DISTINCT \"Trusts (name)\" FROM schools WHERE \"Trusts (name)\" != 'Unknown' ORDER BY \"Trusts (name)\"", conn)
-
-@st.cache_data
-def load_genders():
-    conn = get_connection()
-    return pd.read_sql("SELECT DISTINCT \"Gender (name)\" FROM schools WHERE \"Gender (name)\" != 'Unknown' ORDER BY \"Gender (name)\"", conn)
-
-@st.cache_data
-def load_religions():
-    conn = get_connection()
-    return pd.read_sql("SELECT DISTINCT \"ReligiousCharacter (name)\" FROM schools WHERE \"ReligiousCharacter (name)\" != 'Unknown' ORDER BY \"ReligiousCharacter (name)\"", conn)
-
-@st.cache_data
-def load_all_school_names():
-    conn = get_connection()
-    return pd.read_sql("SELECT DISTINCT EstablishmentName FROM schools ORDER BY EstablishmentName", conn)
+        # WRatio rewards partial matches while typing; plain ratio breaks ties
+        # in favour of names closest to the whole term
+        scored = sorted(
+            ((fuzz.WRatio(term, self.lowered[i]), fuzz.ratio(term, self.lowered[i]), self.names[i]) for i in matched),
+            key=lambda match: (-match[0], -match[1], match[2])
+        )
+        return [name for _, _, name in scored[:limit]]
 
-@st.cache_data
-def load_all_trust_names():
-    conn = get_connection()
-    return pd.read_sql("SELECT DISTINCT \"Trusts (name)\" FROM schools WHERE \"Trusts (name)\" != 'Unknown' ORDER BY \"Trusts (name)\"", conn)
+# One index per name column and data version; older versions are dropped
+@st.cache_resource(max_entries=4)
+def get_suggestion_index(column, data_version):
+    if column == 'EstablishmentName':
+        names = load_all_school_names()['EstablishmentName']
+    else:
+        names = load_dimension_catalog()['Trusts (name)']['Trusts (name)']
+    return SuggestionIndex(names.dropna())
 
-def find_similar_schools(search_term, all_schools, limit=5):
-    """Find similar school names using simple string matching"""
+def find_similar_schools(search_term, limit=5):
+    """Find the school names most similar to the search term"""
     if not search_term:
         return []
-    
-    search_term = search_term.lower()
-    
-    # Get all school names as a list
-    school_names = all_schools['EstablishmentName'].tolist()
-    
-    # Find schools that contain the search term
-    matches = [name for name in school_names if search_term in name.lower()]
-    
-    # If we don't have enough matches, try more flexible matching
-    if len(matches) < limit:
-        # Split search term into words
-        search_words = search_term.split()
-        
-        # Find schools that contain any of the search words
-        for word in search_words:
-            if len(word) > 2:  # Only use words with more than 2 characters
-                word_matches = [name for name in school_names if word in name.lower()]
-                for match in word_matches:
-                    if match not in matches:
-                        matches.append(match)
-                        if len(matches) >= limit:
-                            break
-                if len(matches) >= limit:
-                    break
-    
-    return matches[:limit]
-
-def find_similar_trusts(search_term, all_trusts, limit=5):
-    """Find similar trust names using simple string matching"""
+    index = get_suggestion_index('EstablishmentName', data_version())
+    return index.suggest(search_term, limit)
+
+def find_similar_trusts(search_term, limit=5):
+    """Find the trust names most similar to the search term"""
     if not search_term:
         return []
+    index = get_suggestion_index('Trusts (name)', data_version())
+    return index.suggest(search_term, limit)
+
+@cached_loader(max_mb=64, ttl=3600)
+def search_schools(filters=None, show_all=False, page=1, per_page=20):
+    """A page of the schools matching the filters (all of them with show_all), and their total count"""
+    if dict(normalize_filters(filters)).get('near'):
+        # Radius searches list the nearest schools first
+        urns, distances = rank_by_distance(filters)
+        total_count = len(urns)
+        if not show_all:
+            urns = urns[(page - 1) * per_page:page * per_page]
+            distances = distances[(page - 1) * per_page:page * per_page]
+        ranked = pd.DataFrame({'URN': urns, 'Distance (km)': np.round(distances, 2)})
+        # Merged on URN, in ranked order: schools deleted since the ranking was
+        # cached (mid-ingest, or before a version switch) just drop out
+        schools = ranked.merge(fetch_schools_by_urn(urns), on='URN')
+        columns = schools.columns.drop('Distance (km)').insert(2, 'Distance (km)')
+        return schools[columns], total_count
+    
+    if FILTER_ENGINE == "memory":
+        index = get_filter_index(data_version())
+        mask = index.mask(dict(normalize_filters(filters)))
+        positions = index.positions(mask)
+        if not show_all:
+            positions = positions[(page - 1) * per_page:page * per_page]
+        return fetch_schools_by_urn(index.urns[positions]), mask.bit_count()
+    
+    where, params = compile_filters(filters)
+    
+    if show_all:
+        query = f'SELECT {select_list(LIST_COLUMNS)} FROM schools WHERE 1=1{where} ORDER BY EstablishmentName, URN'
+        return read_sql(query, params=params), count_matching_schools(where, params)
+    
+    return fetch_page(where, params, page, per_page)
+
+def fetch_page(where, params, page, per_page, columns=LIST_COLUMNS):
+    """One page of the schools matching a filter clause, in name order, and their total count"""
+    # The total is computed once per filter set and reused across page turns
+    total_count = count_matching_schools(where, params)
     
-    search_term = search_term.lower()
-    
-    # Get all trust names as a list
-    trust_names = all_trusts['Trusts (name)'].tolist()
-    
-    # Find trusts that contain the search term
-    matches = [name for name in trust_names if search_term in name.lower()]
-    
-    # If we don't have enough matches, try more flexible matching
-    if len(matches) < limit:
-        # Split search term into words
-        search_words = search_term.split()
-        
-        # Find trusts that contain any of the search words
-        for word in search_words:
-            if len(word) > 2:  # Only use words with more than 2 characters
-                word_matches = [name for name in trust_names if word in name.lower()]
-                for match in word_matches:
-                    if match not in matches:
-                        matches.append(match)
-                        if len(matches) >= limit:
-                            break
-                if len(matches) >= limit:
-                    break
-    
-    return matches[:limit]
-
-@st.cache_data
-def search_schools(name="", trust_name="", la="", establishment_groups=None, phase="", postcode="", gender="", religion="", show_all=False, page=1, per_page=20):
-    conn = get_connection()
-    
-    # Build query
-    query = 'SELECT * FROM schools WHERE 1=1'
-    params = []
-    
-    if name:
-        # Use LIKE with wildcards for more flexible matching
-        query += ' AND EstablishmentName LIKE ?'
-        params.append(f'%{name}%')
-    
-    if trust_name:
-        # Use LIKE with wildcards for more flexible matching
-        query += ' AND "Trusts (name)" LIKE ?'
-        params.append(f'%{trust_name}%')
-    
-    if la:
-        query += ' AND "LA (name)" = ?'
-        params.append(la)
-    
-    # Using establishment_groups instead of school_types
-    if establishment_groups and len(establishment_groups) > 0:
-        placeholders = ', '.join(['?' for _ in establishment_groups])
-        query += f' AND "EstablishmentTypeGroup (name)" IN ({placeholders})'
-        params.extend(establishment_groups)
-    
-    if phase:
-        query += ' AND "PhaseOfEducation (name)" = ?'
-        params.append(phase)
-    
-    # Keep the original postcode filter
-    if postcode:
-        query += ' AND Postcode LIKE ?'
-        params.append(f'{postcode}%')
-        
-    if gender:
-        query += ' AND "Gender (name)" = ?'
-        params.append(gender)
-        
-    if religion:
-        query += ' AND "ReligiousCharacter (name)" = ?'
-        params.append(religion)
-    
-    # Get total count for pagination
-    count_query = query.replace('SELECT *', 'SELECT COUNT(*)')
-    count_df = pd.read_sql(count_query, conn, params=params)
-    total_count = count_df.iloc[0, 0]
-    
-    # Add ordering
-    query += ' ORDER BY EstablishmentName'
+    query = f'SELECT {select_list(columns)} FROM schools WHERE 1=1{where}'
     
-    # Add pagination if not showing all results
-    if not show_all:
-        query += ' LIMIT ? OFFSET ?'
-        params.append(per_page)
-        params.append((page - 1) * per_page)
+    # Keyset pagination: seek past the last (EstablishmentName, URN) of the
+    # previous page instead of walking and discarding OFFSET rows
+    if page > 1:
+        anchors = load_page_anchors(where, params, per_page)
+        if page - 2 >= len(anchors):
+            return read_sql(query + ' AND 0', params=params), total_count
+        query += ' AND (EstablishmentName, URN) > (?, ?)'
+        params = params + list(anchors[page - 2])
     
-    # Execute query
-    schools = pd.read_sql(query, conn, params=params)
+    query += ' ORDER BY EstablishmentName, URN LIMIT ?'
+    schools = read_sql(query, params=params + [per_page])
     
     return schools, total_count
 
-@st.cache_data
+@cached_loader(max_mb=16, ttl=6 * 3600)
+def rank_by_distance(filters):
+    """URNs of the schools matching a radius search, nearest first, and their distances in km"""
+    filters = normalize_filters(filters)
+    origin = postcode_location(dict(filters)['near'][0])
+    if origin is None:
+        return np.array([], dtype=np.int64), np.array([], dtype=float)
+    
+    if FILTER_ENGINE == "memory":
+        index = get_filter_index(data_version())
+        positions = index.positions(index.mask(dict(filters)))
+        urns = index.urns[positions]
+        distances = index.distances(positions, origin)
+        order = np.lexsort((urns, distances))
+        return urns[order], distances[order]
+    
+    where, params = compile_filters(filters)
+    ranked = read_sql(f'''
+        SELECT URN, (SELECT distance_km(lat, lon, ?, ?) FROM school_locations WHERE urn = schools.URN) AS distance
+        FROM schools
+        WHERE 1=1{where}
+        ORDER BY distance, URN
+    ''', params=list(origin) + params)
+    return ranked['URN'].to_numpy(), ranked['distance'].to_numpy(dtype=float)
+
+@cached_loader(max_mb=1, ttl=6 * 3600)
+def count_matching_schools(where, params):
+    """Number of schools matching a filter clause"""
+    return int(read_sql(f'SELECT COUNT(*) FROM schools WHERE 1=1{where}', params=params).iloc[0, 0])
+
+@cached_loader(max_mb=16, ttl=6 * 3600)
+def load_page_anchors(where, params, per_page):
+    """Sort key (EstablishmentName, URN) of the last school on each full page.
+
+    Built with one pass over the name index per filter set, so any page can be
+    reached directly by seeking past the anchor of the page before it.
+    """
+    query = f'''
+        SELECT EstablishmentName, URN
+        FROM (
+            SELECT EstablishmentName, URN,
+                   ROW_NUMBER() OVER (ORDER BY EstablishmentName, URN) as RowNumber
+            FROM schools
+            WHERE 1=1{where}
+        )
+        WHERE RowNumber % ? = 0
+        ORDER BY RowNumber
+    '''
+    anchors = read_sql(query, params=params + [per_page])
+    return [(name, int(urn)) for name, urn in anchors.itertuples(index=False, name=None)]
+
+@cached_loader(max_mb=8, ttl=6 * 3600)
 def get_school_details(urn):
-    conn = get_connection()
-    query = "SELECT * FROM schools WHERE URN = ?"
-    return pd.read_sql(query, conn, params=[urn])
+    query = f"SELECT {select_list(DETAIL_COLUMNS)} FROM schools WHERE URN = ?"
+    return read_sql(query, params=[urn])
+
+# Filter clause of a trust's member schools
+TRUST_MEMBERS = ' AND "Trusts (name)" = ?'
+
+@cached_loader(max_mb=16, ttl=6 * 3600)
+def get_trust_schools(trust_name, page=1, per_page=20):
+    """A page of the trust's schools in name order, and how many it has"""
+    return fetch_page(TRUST_MEMBERS, [trust_name], page, per_page, columns=TRUST_COLUMNS)
 
-@st.cache_data
-def get_trust_schools(trust_name):
-    conn = get_connection()
-    query = "SELECT * FROM schools WHERE \"Trusts (name)\" = ?"
-    return pd.read_sql(query, conn, params=[trust_name])
+def trust_rollups_available():
+    return read_sql("SELECT COUNT(*) FROM sqlite_master WHERE name = 'trust_summary'").iloc[0, 0] > 0
+
+# Free school meals bands of the trust profiles, shared with ingest.py's rollups
+FSM_BAND_ORDER = [label for _, label in FSM_BANDS] + [FSM_TOP_BAND, FSM_UNPUBLISHED]
+
+@cached_loader(max_mb=8, ttl=6 * 3600)
+def load_trust_profile(trust_name):
+    """Headline figures and phase, local authority and FSM breakdowns of a trust.
+
+    Read from the trust_summary and trust_rollups tables built by ingest.py, or
+    aggregated from the trust's schools in older databases. None if the trust
+    has no schools.
+    """
+    if trust_rollups_available():
+        summary = read_sql(
+            "SELECT schools, pupils, capacity, local_authorities, fsm_mean FROM trust_summary WHERE trust = ?",
+            params=[trust_name]
+        )
+        breakdowns = read_sql("SELECT dimension, value, count FROM trust_rollups WHERE trust = ?", params=[trust_name])
+    else:
+        members = read_sql(
+            'SELECT "PhaseOfEducation (name)", "LA (name)", NumberOfPupils, SchoolCapacity, PercentageFSM'
+            f' FROM schools WHERE "Trusts (name)" != \'Unknown\'{TRUST_MEMBERS}',
+            params=[trust_name]
+        )
+        summary = pd.DataFrame([{
+            'schools': len(members),
+            'pupils': members['NumberOfPupils'].sum(),
+            'capacity': members['SchoolCapacity'].sum(),
+            'local_authorities': members['LA (name)'].nunique(),
+            'fsm_mean': members['PercentageFSM'].mean()
+        }]) if len(members) else members
+        bands = pd.cut(
+            members['PercentageFSM'], [-np.inf] + [upper for upper, _ in FSM_BANDS] + [np.inf],
+            labels=[label for _, label in FSM_BANDS] + [FSM_TOP_BAND], right=False
+        ).astype(object).fillna(FSM_UNPUBLISHED)
+        breakdowns = pd.concat([
+            values.value_counts().rename_axis('value').reset_index(name='count').assign(dimension=dimension)
+            for dimension, values in (
+                ('PhaseOfEducation', members['PhaseOfEducation (name)']),
+                ('LA', members['LA (name)']),
+                ('FSM', bands)
+            )
+        ])
+    
+    if summary.empty:
+        return None
+    
+    def breakdown(dimension, label):
+        rows = breakdowns[breakdowns['dimension'] == dimension]
+        return pd.DataFrame({label: rows['value'].tolist(), 'Count': rows['count'].astype(int).tolist()})
+    
+    row = summary.iloc[0]
+    fsm = breakdown('FSM', 'FSM')
+    fsm = fsm.set_index('FSM').reindex(FSM_BAND_ORDER, fill_value=0).reset_index()
+    return {
+        'schools': int(row['schools']),
+        'pupils': int(row['pupils']),
+        'capacity': int(row['capacity']),
+        'local_authorities': int(row['local_authorities']),
+        'fsm_mean': None if pd.isna(row['fsm_mean']) else float(row['fsm_mean']),
+        'phases': breakdown('PhaseOfEducation', 'PhaseOfEducation').sort_values(['Count', 'PhaseOfEducation'], ascending=[False, True], ignore_index=True),
+        'la_spread': breakdown('LA', 'LocalAuthority').sort_values(['Count', 'LocalAuthority'], ascending=[False, True], ignore_index=True),
+        'fsm': fsm
+    }
 
 # Load summary statistics
-@st.cache_data
 def load_summary_stats(filters=None):
-    conn = get_connection()
-    
-    # Base queries
-    total_query = "SELECT COUNT(*) as count FROM schools WHERE 1=1"
-    primary_query = "SELECT COUNT(*) as count FROM schools WHERE \"PhaseOfEducation (name)\" = 'Primary'"
-    secondary_query = "SELECT COUNT(*) as count FROM schools WHERE \"PhaseOfEducation (name)\" = 'Secondary'"
-    
-    params_total = []
-    params_primary = []
-    params_secondary = []
-    
-    # Add filters if provided
-    if filters:
-        if filters.get('name'):
-            filter_clause = ' AND EstablishmentName LIKE ?'
-            total_query += filter_clause
-            primary_query += filter_clause
-            secondary_query += filter_clause
-            params_total.append(f'%{filters["name"]}%')
-            params_primary.append(f'%{filters["name"]}%')
-            params_secondary.append(f'%{filters["name"]}%')
-            
-        if filters.get('trust_name'):
-            filter_clause = ' AND "Trusts (name)" LIKE ?'
-            total_query += filter_clause
-            primary_query += filter_clause
-            secondary_query += filter_clause
-            params_total.append(f'%{filters["trust_name"]}%')
-            params_primary.append(f'%{filters["trust_name"]}%')
-            params_secondary.append(f'%{filters["trust_name"]}%')
-        
-        if filters.get('la'):
-            filter_clause = ' AND "LA (name)" = ?'
-            total_query += filter_clause
-            primary_query += filter_clause
-            secondary_query += filter_clause
-            params_total.append(filters["la"])
-            params_primary.append(filters["la"])
-            params_secondary.append(filters["la"])
-        
-        # Using establishment_groups instead of school_types
-        if filters.get('establishment_groups') and len(filters["establishment_groups"]) > 0:
-            placeholders = ', '.join(['?' for _ in filters["establishment_groups"]])
-            filter_clause = f' AND "EstablishmentTypeGroup (name)" IN ({placeholders})'
-            total_query += filter_clause
-            primary_query += filter_clause
-            secondary_query += filter_clause
-            params_total.extend(filters["establishment_groups"])
-            params_primary.extend(filters["establishment_groups"])
-            params_secondary.extend(filters["establishment_groups"])
+    return load_dashboard_aggregates(filters)["stats"]
+
+# Export format label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet")
+}
+
+# Prepared exports are kept in their own directory, swept before each new
+# export: files older than EXPORT_MAX_AGE seconds are removed, then the oldest
+# until the directory is within SCHOOLS_EXPORT_DIR_MAX_MB
+EXPORT_DIR = os.environ.get("SCHOOLS_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "schools_dashboard_exports"))
+EXPORT_DIR_MAX_MB = int(os.environ.get("SCHOOLS_EXPORT_DIR_MAX_MB", "512"))
+EXPORT_MAX_AGE = 3600
+
+def sweep_exports():
+    """Remove expired exports, then the oldest ones until the directory fits its size limit"""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    exports = []
+    for entry in os.scandir(EXPORT_DIR):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        exports.append((stat.st_mtime, stat.st_size, entry.path))
+    
+    total = sum(size for _, size, _ in exports)
+    expired = time.time() - EXPORT_MAX_AGE
+    for modified, size, path in sorted(exports):
+        if modified > expired and total <= EXPORT_DIR_MAX_MB * 2**20:
+            break
+        remove_export(path)
+        total -= size
+
+def remove_export(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        # Already swept
+        pass
+
+def export_schools(filters, export_format, chunk_size=5000):
+    """Stream every school matching the filters into a temporary file; returns its path"""
+    where, params = compile_filters(filters)
+    return export_rows(where, params, export_format, chunk_size=chunk_size)
+
+@profiled("export", size=os.path.getsize)
+def export_rows(where, params, export_format, columns=LIST_COLUMNS, chunk_size=5000):
+    """Stream the schools matching a filter clause into a temporary file, one chunk at a time.
+
+    Rows are fetched from SQLite in chunks of chunk_size and appended to the
+    file, so memory use while exporting does not grow with the result size.
+    Returns the path of the file, in EXPORT_DIR.
+    """
+    extension, _ = EXPORT_FORMATS[export_format]
+    selected = ', '.join(f'"{column}" as "{header}"' for column, header in columns.items())
+    query = f'SELECT {selected} FROM schools WHERE 1=1{where} ORDER BY EstablishmentName, URN'
+    chunks = read_sql(query, params=params, chunksize=chunk_size)
+    
+    sweep_exports()
+    with tempfile.NamedTemporaryFile(dir=EXPORT_DIR, suffix=f".{extension}", delete=False) as output:
+        path = output.name
+    
+    if extension == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.schema([(header, pa.int64() if column == 'URN' else pa.string()) for column, header in columns.items()])
+        with pq.ParquetWriter(path, schema) as writer:
+            for chunk in chunks:
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        return path
+    
+    opener = gzip.open if extension == "csv.gz" else open
+    with opener(path, "wt", newline="") as output:
+        # Header first so empty results still produce a valid file
+        output.write(",".join(columns.values()) + "\n")
+        for chunk in chunks:
+            chunk.to_csv(output, header=False, index=False)
+    return path
+
+# Map panel: markers are grid clusters of about MAP_CELL_PX pixels until
+# MAP_DETAIL_ZOOM, where the schools in view are drawn individually if
+# there are at most MAP_POINT_LIMIT of them
+MAP_CELL_PX = 48
+MAP_DETAIL_ZOOM = 12
+MAP_POINT_LIMIT = 2000
+MAP_HEIGHT_PX = 500
+
+@cached_loader(max_mb=32, ttl=6 * 3600)
+def load_school_locations(filters=None):
+    """URN, lat and lon of the schools matching the filters that have a known location"""
+    if FILTER_ENGINE == "memory":
+        index = get_filter_index(data_version())
+        positions = index.positions(index.mask(dict(normalize_filters(filters))))
+        located = pd.DataFrame({'URN': index.urns[positions], 'lat': index.lat[positions], 'lon': index.lon[positions]})
+        return located.dropna().reset_index(drop=True)
+    
+    where, params = compile_filters(filters)
+    query = 'SELECT urn AS URN, lat, lon FROM school_locations'
+    if where:
+        query += f' WHERE urn IN (SELECT URN FROM schools WHERE 1=1{where})'
+    return read_sql(query, params=params)
+
+def map_viewport(centre, zoom, width_px=1400):
+    """(min_lat, max_lat, min_lon, max_lon) of the map area around a centre at a zoom level.
+
+    Sized for a wide map with half a screen of margin on every side, so
+    markers are already there when the user pans a little.
+    """
+    lon_span = 360 * width_px / (256 * 2 ** zoom) * 2
+    lat_span = lon_span * MAP_HEIGHT_PX / width_px * np.cos(np.radians(centre[0]))
+    return centre[0] - lat_span / 2, centre[0] + lat_span / 2, centre[1] - lon_span / 2, centre[1] + lon_span / 2
+
+@cached_loader(max_mb=8, ttl=6 * 3600)
+def load_map_markers(filters, zoom, centre):
+    """Map markers for the filtered schools in view, clustered on a grid unless zoomed in.
+
+    Each marker has lat, lon, Count and Label. Clusters sit at the mean position
+    of their schools, so the number of markers depends on the zoom and the
+    viewport, not on how many schools match.
+    """
+    located = load_school_locations(filters)
+    min_lat, max_lat, min_lon, max_lon = map_viewport(centre, zoom)
+    located = located[located['lat'].between(min_lat, max_lat) & located['lon'].between(min_lon, max_lon)]
+    
+    if zoom >= MAP_DETAIL_ZOOM and len(located) <= MAP_POINT_LIMIT:
+        # Merged on URN: the locations table may still list schools since deleted
+        names = fetch_schools_by_urn(located['URN'], columns=['URN', 'EstablishmentName'])
+        located = located.merge(names, on='URN')
+        return pd.DataFrame({
+            'lat': located['lat'].to_numpy(),
+            'lon': located['lon'].to_numpy(),
+            'Count': 1,
+            'Label': located['EstablishmentName'].to_numpy()
+        })
+    
+    cell = 360 * MAP_CELL_PX / (256 * 2 ** zoom)
+    rows = np.floor((located['lat'].to_numpy() + 90) / cell).astype(np.int64)
+    cols = np.floor((located['lon'].to_numpy() + 180) / cell).astype(np.int64)
+    _, cluster, counts = np.unique(rows * 1_000_000 + cols, return_inverse=True, return_counts=True)
+    return pd.DataFrame({
+        'lat': np.bincount(cluster, located['lat'].to_numpy()) / counts,
+        'lon': np.bincount(cluster, located['lon'].to_numpy()) / counts,
+        'Count': counts,
+        'Label': [f"{count:,} schools" if count > 1 else "1 school" for count in counts]
+    })
+
+def frame_hash(data):
+    """Content hash of an aggregate frame, including its column names"""
+    digest = hashlib.sha1(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+    digest.update(repr(list(data.columns)).encode())
+    return digest.hexdigest()
+
+@st.cache_resource(max_entries=128, show_spinner=False)
+def _built_figure(builder_name, data_hash, args, _build):
+    # Figures are shared by every session and must not be modified after building
+    return _build()
+
+def cached_figure(builder):
+    """Build a chart once per distinct aggregate data (and any extra hashable arguments)"""
+    @functools.wraps(builder)
+    def wrapper(data, *args):
+        started = time.perf_counter()
+        built = []
         
-        if filters.get('phase'):
-            filter_clause = ' AND "PhaseOfEducation (name)" = ?'
-            total_query += filter_clause
-            primary_query += filter_clause
-            secondary_query += filter_clause
-            params_total.append(filters["phase"])
-            params_primary.append(filters["phase"])
-            params_secondary.append(filters["phase"])
+        def build():
+            built.append(True)
+            return builder(data, *args)
         
-        # Keep the original postcode filter
-        if filters.get('postcode'):
-            filter_clause = ' AND Postcode LIKE ?'
-            total_query += filter_clause
-            primary_query += filter_clause
-            secondary_query += filter_clause
-            params_total.append(f'{filters["postcode"]}%')
-            params_primary.append(f'{filters["postcode"]}%')
-            params_secondary.append(f'{filters["postcode"]}%')
-            
-        if filters.get('gender'):
-            filter_clause = ' AND "Gender (name)" = ?'
-            total_query += filter_clause
-            primary_query += filter_clause
-            secondary_query += filter_clause
-            params_total.append(filters["gender"])
-            params_primary.append(filters["gender"])
-            params_secondary.append(filters["gender"])
-            
-        if filters.get('religion'):
-            filter_clause = ' AND "ReligiousCharacter (name)" = ?'
-            total_query += filter_clause
-            primary_query += filter_clause
-            secondary_query += filter_clause
-            params_total.append(filters["religion"])
-            params_primary.append(filters["religion"])
-            params_secondary.append(filters["religion"])
-    
-    # Execute queries
-    total_df = pd.read_sql(total_query, conn, params=params_total)
-    primary_df = pd.read_sql(primary_query, conn, params=params_primary)
-    secondary_df = pd.read_sql(secondary_query, conn, params=params_secondary)
-    
-    # Extract values
-    total_schools = total_df.iloc[0, 0]
-    primary_schools = primary_df.iloc[0, 0]
-    secondary_schools = secondary_df.iloc[0, 0]
-    
-    return {
-        "total": total_schools,
-        "primary": primary_schools,
-        "secondary": secondary_schools
-    }
+        fig = _built_figure(builder.__name__, frame_hash(data), args, build)
+        if PROFILING:
+            get_profiler().record("figure", builder.__name__, time.perf_counter() - started, "miss" if built else "hit", len(data))
+        return fig
+    return wrapper
 
 # Create charts
+@cached_figure
 def create_school_types_chart(data):
     fig = px.pie(
         data, 
@@ -545,6 +1680,7 @@ def create_school_types_chart(data):
     )
     return fig
 
+@cached_figure
 def create_phase_chart(data):
     fig = px.bar(
         data, 
@@ -557,6 +1693,7 @@ def create_phase_chart(data):
     fig.update_layout(margin=dict(t=30, b=0, l=0, r=0), xaxis_tickangle=-45)
     return fig
 
+@cached_figure
 def create_religion_chart(data):
     fig = px.pie(
         data, 
@@ -573,6 +1710,7 @@ def create_religion_chart(data):
     )
     return fig
 
+@cached_figure
 def create_gender_chart(data):
     fig = px.pie(
         data, 
@@ -589,7 +1727,68 @@ def create_gender_chart(data):
     )
     return fig
 
+@cached_figure
+def create_trust_phase_chart(data):
+    fig = px.pie(
+        data,
+        values='Count',
+        names='PhaseOfEducation',
+        title='Phase Mix',
+        hole=0.4,
+    )
+    fig.update_layout(margin=dict(t=30, b=0, l=0, r=0))
+    fig.update_traces(
+        hoverinfo='label+percent+value',
+        textinfo='label+value',
+        textfont_size=12,
+    )
+    return fig
+
+@cached_figure
+def create_fsm_chart(data):
+    fig = px.bar(
+        data,
+        x='FSM',
+        y='Count',
+        title='Free School Meals',
+        labels={'FSM': 'Pupils eligible for FSM', 'Count': 'Number of Schools'}
+    )
+    fig.update_layout(margin=dict(t=30, b=0, l=0, r=0))
+    return fig
+
+@cached_figure
+def create_trust_la_chart(data):
+    fig = px.bar(
+        data,
+        x='Count',
+        y='LocalAuthority',
+        orientation='h',
+        title='Local Authority Spread',
+        labels={'LocalAuthority': 'Local Authority', 'Count': 'Number of Schools'}
+    )
+    fig.update_layout(margin=dict(t=30, b=0, l=0, r=0), yaxis={'autorange': 'reversed'})
+    return fig
+
+@cached_figure
+def create_school_map(markers, centre, zoom):
+    fig = px.scatter_map(
+        markers,
+        lat='lat',
+        lon='lon',
+        size='Count' if markers['Count'].max() > 1 else None,
+        size_max=40,
+        hover_name='Label',
+        hover_data={'lat': False, 'lon': False, 'Count': False},
+        zoom=zoom,
+        center={'lat': centre[0], 'lon': centre[1]},
+        map_style='carto-positron',
+        height=MAP_HEIGHT_PX
+    )
+    fig.update_layout(margin=dict(t=0, b=0, l=0, r=0))
+    return fig
+
 # Function to create a direct HTML component for the infographic
+@profiled("render", size=len)
 def create_infographic_component(school_details):
     # Convert school details to the format expected by the infographic generator
     school_data = {
@@ -932,36 +2131,398 @@ def create_infographic_component(school_details):
     
     return html_content
 
+@profiled("render")
+def render_diagnostics():
+    """Debug panel, shown when the dashboard is opened with ?debug=1"""
+    with st.expander("Diagnostics"):
+        monitor = get_data_monitor()
+        st.write(f"**Data version:** {monitor.served}" + (f" (rebuilding caches for {monitor.pending})" if monitor.pending else ""))
+        
+        st.subheader("Connection pool")
+        st.dataframe(pd.DataFrame([get_pool().stats()]), use_container_width=True, hide_index=True)
+        
+        st.subheader("Loader caches")
+        st.dataframe(
+            pd.DataFrame([cache.stats() for cache in _loader_caches().values()]),
+            use_container_width=True,
+            hide_index=True
+        )
+        
+        st.subheader("Profile")
+        if not PROFILING:
+            st.caption("Start the dashboard with SCHOOLS_PROFILE=1 to time every loader, query, chart, export and panel.")
+        else:
+            ctx = get_script_run_ctx(suppress_warning=True)
+            calls = get_profiler().run_calls(ctx.session_id if ctx else None)
+            st.caption("Calls of this run so far, slowest first. Loader, render and figure times include the calls they make.")
+            if calls:
+                run = pd.DataFrame(calls).drop(columns=["session"]).astype({"rows": "Int64", "bytes": "Int64"})
+                run = run.sort_values("ms", ascending=False)
+                st.dataframe(run, use_container_width=True, hide_index=True)
+            st.caption("Totals since the server started")
+            st.dataframe(get_profiler().summary(), use_container_width=True, hide_index=True)
+            col1, col2 = st.columns(2)
+            col1.download_button(
+                "Download this run (JSON lines)",
+                "".join(json.dumps(call) + "\n" for call in calls),
+                file_name="profile.jsonl",
+                mime="application/x-ndjson"
+            )
+            col2.download_button(
+                "Download metrics (Prometheus)",
+                profile_metrics(),
+                file_name="metrics.prom",
+                mime="text/plain"
+            )
+        
+        st.subheader("Query plans")
+        st.caption("Plans for the queries the dashboard has issued most recently. Queries that scan the whole schools table are flagged.")
+        for plan in explain_recent_queries():
+            label = "Full table scan" if plan["full_scan"] else "Uses index"
+            st.markdown(f"**{label}**")
+            st.code(plan["query"].strip(), language="sql")
+            st.text("\n".join(plan["plan"]) + f"\nParameters: {plan['params']}")
+
+@st.fragment
+@profiled("render")
+def render_school_map(filter_key):
+    """Map of the filtered schools; zooming or re-centring reruns only this fragment"""
+    located = load_school_locations(filter_key)
+    if located.empty:
+        st.info("None of the matching schools has a known location.")
+        return
+    
+    col1, col2 = st.columns([3, 1])
+    with col2:
+        zoom = st.slider("Map zoom", min_value=5, max_value=16, value=6, key="map_zoom")
+        centre_postcode = st.text_input("Centre on postcode", key="map_centre")
+        st.caption(f"Schools are grouped until zoom {MAP_DETAIL_ZOOM}, then shown individually.")
+    
+    # Centre on the chosen postcode, the radius search or the matching schools
+    near = dict(filter_key).get('near')
+    centre = None
+    if centre_postcode:
+        centre = postcode_location(centre_postcode)
+        if centre is None:
+            col2.warning(f"Postcode {format_postcode(centre_postcode)} was not found")
+    if centre is None and near:
+        centre = postcode_location(near[0])
+    if centre is None:
+        centre = (round(float(located['lat'].mean()), 4), round(float(located['lon'].mean()), 4))
+    
+    markers = load_map_markers(filter_key, zoom, centre)
+    with col1:
+        if markers.empty:
+            st.info("No matching schools in this part of the map.")
+        else:
+            st.plotly_chart(create_school_map(markers, centre, zoom), use_container_width=True)
+
+def render_export_controls(key, source, filename, export, what, description):
+    """Format picker and download button for an export made only when asked for.
+
+    export(export_format) writes the file and returns its path. The file is
+    kept in session state under key until source or the format changes, or
+    until it is swept from EXPORT_DIR. Streamlit serves a download from
+    memory, so the prepared file is read whole while its button is shown.
+    """
+    export_format = st.selectbox("Export format", list(EXPORT_FORMATS), key=f"{key}_format")
+    prepared = st.session_state.get(key)
+    if prepared and (prepared['source'] != source or prepared['format'] != export_format):
+        discard_export(key)
+        prepared = None
+    
+    if prepared is None:
+        if st.button("Prepare Download", key=f"{key}_prepare", help=f"Export {description}"):
+            with st.spinner("Exporting schools..."):
+                prepared = {'source': source, 'format': export_format, 'path': export(export_format)}
+            st.session_state[key] = prepared
+    
+    if prepared is not None:
+        extension, mime = EXPORT_FORMATS[export_format]
+        try:
+            export_file = open(prepared['path'], "rb")
+        except FileNotFoundError:
+            # Swept while the session was idle
+            del st.session_state[key]
+            st.caption("The prepared download has expired. Prepare it again.")
+            return
+        with export_file:
+            st.download_button(
+                label=f"Download {what} as {export_format}",
+                data=export_file,
+                file_name=f"{filename}.{extension}",
+                mime=mime,
+                help=f"Download {description}"
+            )
+
+def discard_export(key):
+    """Remove the session's prepared export under key, if any"""
+    prepared = st.session_state.pop(key, None)
+    if prepared:
+        remove_export(prepared['path'])
+
+def set_page(page):
+    """Move the school list to another page before its fragment reruns"""
+    st.session_state.page = page
+
+@st.fragment
+@profiled("render")
+def render_school_list(current_filters, filter_key, per_page):
+    """School list with export and details; turning a page reruns only this fragment"""
+    page = st.session_state.get("page", 1)
+    
+    # A full run has already loaded this page alongside the aggregates, so this
+    # is a cache hit unless the page has just been turned
+    schools, total_count = search_schools(filter_key, show_all=current_filters['show_all'], page=page, per_page=per_page)
+    
+    # Pagination controls (only show if not showing all results)
+    if not current_filters['show_all']:
+        total_pages = max(1, (total_count + per_page - 1) // per_page)
+        
+        col1, col2, col3 = st.columns([1, 3, 1])
+        
+        with col1:
+            st.button("Previous Page", disabled=(page <= 1), on_click=set_page, args=(page - 1,))
+        
+        with col2:
+            st.write(f"Page {page} of {total_pages} (Showing {len(schools)} of {total_count} schools)")
+        
+        with col3:
+            st.button("Next Page", disabled=(page >= total_pages), on_click=set_page, args=(page + 1,))
+    else:
+        st.write(f"Showing all {len(schools)} schools matching your criteria")
+    
+    # Display schools
+    if not schools.empty:
+        # Label the projected columns with their display headers
+        display_df = schools.rename(columns=LIST_COLUMNS)
+        
+        # Create a descriptive filename based on filters
+        filename_parts = ["schools"]
+        if current_filters['name']:
+            filename_parts.append(f"name_{current_filters['name'].replace(' ', '_')}")
+        if current_filters['trust_name']:
+            filename_parts.append(f"trust_{current_filters['trust_name'].replace(' ', '_')}")
+        if current_filters['la']:
+            filename_parts.append(f"la_{current_filters['la'].replace(' ', '_')}")
+        if current_filters['phase']:
+            filename_parts.append(current_filters['phase'].replace(' ', '_'))
+        if current_filters['near_postcode']:
+            filename_parts.append(f"within_{current_filters['radius_km']}km_of_{format_postcode(current_filters['near_postcode']).replace(' ', '')}")
+        
+        filename = "_".join(filename_parts)
+        
+        # The export is only generated when asked for, streamed from SQLite in chunks
+        col1, col2 = st.columns([3, 1])
+        with col2:
+            render_export_controls(
+                "export", filter_key, filename, functools.partial(export_schools, filter_key),
+                "Results", "all schools matching the current filters"
+            )
+        
+        # Display the table with improved formatting
+        st.dataframe(
+            display_df, 
+            use_container_width=True,
+            column_config={
+                "URN": st.column_config.NumberColumn(format="%d"),
+                "School Name": st.column_config.TextColumn(width="large"),
+                "Trust": st.column_config.TextColumn(width="large"),
+            },
+            hide_index=True
+        )
+        
+        render_school_details(schools)
+    else:
+        discard_export("export")
+        st.info("No schools found matching your criteria. Try adjusting your filters.")
+
+@st.fragment
+@profiled("render")
+def render_school_details(schools):
+    """Details tabs for a school on the current page; choosing another school reruns only this fragment"""
+    st.header("School Details")
+    selected_urn = st.selectbox("Select a school to view details", schools['URN'].tolist(), format_func=lambda x: schools[schools['URN'] == x]['EstablishmentName'].iloc[0])
+    
+    if selected_urn:
+        school_details = get_school_details(selected_urn).iloc[0]
+        
+        # Create tabs for different categories of information
+        tabs = st.tabs(["Basic Info", "Contact Info", "Statistics", "Administrative", "School Infographic"])
+        
+        with tabs[0]:  # Basic Info tab
+            col1, col2 = st.columns(2)
+            with col1:
+                st.subheader("Basic Information")
+                st.write(f"**URN:** {school_details['URN']}")
+                st.write(f"**Name:** {school_details['EstablishmentName']}")
+                st.write(f"**Type:** {school_details['TypeOfEstablishment (name)']}")
+                st.write(f"**Phase:** {school_details['PhaseOfEducation (name)']}")
+                st.write(f"**Local Authority:** {school_details['LA (name)']}")
+                st.write(f"**Establishment Group:** {school_details['EstablishmentTypeGroup (name)']}")
+                st.write(f"**Gender:** {school_details['Gender (name)']}")
+                st.write(f"**Religious Character:** {school_details['ReligiousCharacter (name)']}")
+        
+        with tabs[1]:  # Contact Info tab
+            st.subheader("Contact Information")
+            st.write(f"**Address:** {school_details['FullAddress']}")
+            st.write(f"**Postcode:** {school_details['Postcode']}")
+            st.write(f"**Telephone:** {school_details['TelephoneNum']}")
+            
+            website = school_details['SchoolWebsite']
+            if website and website != 'Not provided':
+                st.write(f"**Website:** [{website}]({website})")
+            else:
+                st.write("**Website:** Not provided")
+            
+            st.write(f"**Head Teacher:** {school_details['HeadTeacherFullName']}")
+            st.write(f"**Head Title:** {school_details['HeadPreferredJobTitle']}")
+        
+        with tabs[2]:  # Statistics tab
+            st.subheader("School Statistics")
+            st.write(f"**School Capacity:** {int(school_details['SchoolCapacity'])}")
+            st.write(f"**Number of Pupils:** {int(school_details['NumberOfPupils'])}")
+            st.write(f"**Percentage FSM:** {school_details['PercentageFSM']}%")
+            st.write(f"**Statutory Low Age:** {int(school_details['StatutoryLowAge'])}")
+            st.write(f"**Statutory High Age:** {int(school_details['StatutoryHighAge'])}")
+            st.write(f"**Nursery Provision:** {school_details['NurseryProvision (name)']}")
+            st.write(f"**Official Sixth Form:** {school_details['OfficialSixthForm (name)']}")
+        
+        with tabs[3]:  # Administrative tab
+            st.subheader("Administrative Information")
+            trust_name = school_details['Trusts (name)']
+            st.write(f"**Trust:** {trust_name}")
+            
+            # Add button to view all schools in this trust
+            if trust_name != 'Unknown':
+                if st.button(f"View Trust Profile: {trust_name}"):
+                    st.session_state.view_trust = trust_name
+                    st.session_state.trust_page = 1
+                    # The trust view sits outside this fragment
+                    st.rerun(scope="app")
+            
+            st.write(f"**Federation:** {school_details['Federations (name)']}")
+            st.write(f"**District:** {school_details['DistrictAdministrative (name)']}")
+            st.write(f"**Ward:** {school_details['AdministrativeWard (name)']}")
+            st.write(f"**Parliamentary Constituency:** {school_details['ParliamentaryConstituency (name)']}")
+            st.write(f"**Urban/Rural:** {school_details['UrbanRural (name)']}")
+        
+        with tabs[4]:  # Infographic tab
+            st.subheader("School Infographic")
+            st.write("Below is an infographic for this school. You can download it as an image using the button at the bottom.")
+            
+            # Generate the infographic HTML
+            infographic_html = create_infographic_component(school_details)
+            
+            # Display the infographic using st.components.v1.html
+            st.components.v1.html(infographic_html, height=900, scrolling=True)
+
+def clear_trust_view():
+    del st.session_state.view_trust
+    discard_export("trust_export")
+
+def set_trust_page(page):
+    """Move the trust's member list to another page before its fragment reruns"""
+    st.session_state.trust_page = page
+
+@st.fragment
+@profiled("render")
+def render_trust_view(per_page):
+    """Profile of the trust chosen from a school's details, with its schools a page at a time"""
+    if 'view_trust' not in st.session_state:
+        return
+    
+    trust_name = st.session_state.view_trust
+    st.header(f"Trust Profile: {trust_name}")
+    
+    profile = load_trust_profile(trust_name)
+    if profile is None:
+        discard_export("trust_export")
+        st.info(f"No schools found for trust: {trust_name}")
+        st.button("Clear Trust View", on_click=clear_trust_view)
+        return
+    
+    # Headline figures, precomputed at ingest
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Schools", f"{profile['schools']:,}")
+    col2.metric("Pupils", f"{profile['pupils']:,}")
+    col3.metric("Capacity", f"{profile['capacity']:,}")
+    col4.metric("Local Authorities", f"{profile['local_authorities']:,}")
+    col5.metric("Mean FSM", "n/a" if profile['fsm_mean'] is None else f"{profile['fsm_mean']:.1f}%")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.plotly_chart(create_trust_phase_chart(profile['phases']), use_container_width=True)
+    with col2:
+        st.plotly_chart(create_fsm_chart(profile['fsm']), use_container_width=True)
+    with col3:
+        # The largest trusts span dozens of authorities; chart the main ones
+        st.plotly_chart(create_trust_la_chart(profile['la_spread'].head(10)), use_container_width=True)
+    
+    st.subheader("Member Schools")
+    page = st.session_state.get('trust_page', 1)
+    trust_schools, total_count = get_trust_schools(trust_name, page=page, per_page=per_page)
+    total_pages = max(1, (total_count + per_page - 1) // per_page)
+    
+    col1, col2, col3 = st.columns([1, 3, 1])
+    with col1:
+        st.button("Previous Page", key="trust_previous", disabled=(page <= 1), on_click=set_trust_page, args=(page - 1,))
+    with col2:
+        st.write(f"Page {page} of {total_pages} (Showing {len(trust_schools)} of {total_count} schools)")
+    with col3:
+        st.button("Next Page", key="trust_next", disabled=(page >= total_pages), on_click=set_trust_page, args=(page + 1,))
+    
+    col1, col2 = st.columns([3, 1])
+    with col2:
+        render_export_controls(
+            "trust_export", trust_name, f"schools_in_{trust_name.replace(' ', '_')}",
+            functools.partial(export_rows, TRUST_MEMBERS, [trust_name], columns=TRUST_COLUMNS),
+            "Trust Schools", "all schools in this trust"
+        )
+    
+    # Label the projected columns with their display headers
+    st.dataframe(
+        trust_schools.rename(columns=TRUST_COLUMNS),
+        use_container_width=True,
+        column_config={
+            "URN": st.column_config.NumberColumn(format="%d"),
+            "School Name": st.column_config.TextColumn(width="large"),
+        },
+        hide_index=True
+    )
+    
+    st.button("Clear Trust View", on_click=clear_trust_view)
+
 # Main app
+@profiled("render")
 def main():
+    # Serve the latest data version whose caches are ready
+    get_data_monitor().check()
+    
+    if PROFILING:
+        ctx = get_script_run_ctx(suppress_warning=True)
+        if ctx:
+            get_profiler().start_run(ctx.session_id)
+    
     # Initialize session state for filters
     if 'filters' not in st.session_state:
-        st.session_state.filters = {
-            'name': '',
-            'trust_name': '',
-            'la': '',
-            'establishment_groups': [], # Changed from school_types to establishment_groups
-            'phase': '',
-            'postcode': '', # Kept as postcode (from fixed_app.py)
-            'gender': '',
-            'religion': '',
-            'show_all': False
-        }
+        st.session_state.filters = dict(DEFAULT_FILTERS, establishment_groups=[])
     
     # Initialize pagination
     if 'page' not in st.session_state:
         st.session_state.page = 1
     
-    # Load data
-    metadata = load_metadata()
-    local_authorities = load_local_authorities()
-    establishment_groups = load_establishment_groups() # Changed from establishment_types to establishment_groups
-    phases = load_phases()
-    trusts = load_trusts()
-    genders = load_genders()
-    religions = load_religions()
-    all_school_names = load_all_school_names()
-    all_trust_names = load_all_trust_names()
+    # Load data (every sidebar option list comes from the one dimension catalog,
+    # narrowed to the options that match schools under the applied filters)
+    applied = st.session_state.filters
+    options = load_concurrently(
+        metadata=load_metadata,
+        catalog=load_dimension_catalog,
+        facets=functools.partial(load_facet_counts, normalize_filters(applied))
+    )
+    metadata = options['metadata']
+    catalog = options['catalog']
+    facets = options['facets']
     
     # Sidebar - Filters
     st.sidebar.title("England Schools Dashboard")
@@ -974,7 +2535,7 @@ def main():
     name_filter = st.sidebar.text_input("School Name", value=st.session_state.filters['name'])
     if name_filter:
         # Show suggestions based on similar search
-        suggestions = find_similar_schools(name_filter, all_school_names, limit=5)
+        suggestions = find_similar_schools(name_filter, limit=5)
         if suggestions:
             selected_suggestion = st.sidebar.selectbox(
                 "Did you mean:", 
@@ -988,7 +2549,7 @@ def main():
     trust_filter = st.sidebar.text_input("Trust Name", value=st.session_state.filters['trust_name'])
     if trust_filter:
         # Show suggestions based on similar search
-        suggestions = find_similar_trusts(trust_filter, all_trust_names, limit=5)
+        suggestions = find_similar_trusts(trust_filter, limit=5)
         if suggestions:
             selected_suggestion = st.sidebar.selectbox(
                 "Did you mean (Trust):", 
@@ -999,45 +2560,59 @@ def main():
                 trust_filter = selected_suggestion
     
     # Local authority filter
-    la_options = [""] + local_authorities["LA (name)"].tolist()
+    la_options = [""] + facet_options(catalog, facets['la'], "LA (name)", keep=[applied['la']])
     la_filter = st.sidebar.selectbox(
         "Local Authority",
         la_options,
+        format_func=option_label(facets['la']),
         index=la_options.index(st.session_state.filters['la']) if st.session_state.filters['la'] in la_options else 0
     )
     
     # Establishment group type filter (changed from school_types to establishment_groups)
-    group_options = establishment_groups["EstablishmentTypeGroup (name)"].tolist()
+    group_options = facet_options(catalog, facets['establishment_groups'], "EstablishmentTypeGroup (name)", keep=applied['establishment_groups'])
     group_filter = st.sidebar.multiselect(
         "Establishment Group Type",
         group_options,
+        format_func=option_label(facets['establishment_groups']),
         default=st.session_state.filters['establishment_groups']
     )
     
     # Phase filter
-    phase_options = [""] + phases["PhaseOfEducation (name)"].tolist()
+    phase_options = [""] + facet_options(catalog, facets['phase'], "PhaseOfEducation (name)", keep=[applied['phase']])
     phase_filter = st.sidebar.selectbox(
         "Phase of Education",
         phase_options,
+        format_func=option_label(facets['phase']),
         index=phase_options.index(st.session_state.filters['phase']) if st.session_state.filters['phase'] in phase_options else 0
     )
     
     # Postcode filter (kept as in fixed_app.py)
     postcode_filter = st.sidebar.text_input("Postcode (starts with)", value=st.session_state.filters['postcode'])
     
+    # Radius search around a postcode (needs postcode centroids, see ingest.py --postcodes)
+    near_filter = ''
+    radius_filter = st.session_state.filters['radius_km']
+    if locations_available():
+        near_filter = st.sidebar.text_input("Near postcode", value=st.session_state.filters['near_postcode'])
+        radius_filter = st.sidebar.slider("Within (km)", min_value=1, max_value=50, value=int(radius_filter))
+        if near_filter and postcode_location(near_filter) is None:
+            st.sidebar.warning(f"Postcode {format_postcode(near_filter)} was not found")
+    
     # Gender filter
-    gender_options = [""] + genders["Gender (name)"].tolist()
+    gender_options = [""] + facet_options(catalog, facets['gender'], "Gender (name)", keep=[applied['gender']])
     gender_filter = st.sidebar.selectbox(
         "Gender",
         gender_options,
+        format_func=option_label(facets['gender']),
         index=gender_options.index(st.session_state.filters['gender']) if st.session_state.filters['gender'] in gender_options else 0
     )
     
     # Religious character filter
-    religion_options = [""] + religions["ReligiousCharacter (name)"].tolist()
+    religion_options = [""] + facet_options(catalog, facets['religion'], "ReligiousCharacter (name)", keep=[applied['religion']])
     religion_filter = st.sidebar.selectbox(
         "Religious Character",
         religion_options,
+        format_func=option_label(facets['religion']),
         index=religion_options.index(st.session_state.filters['religion']) if st.session_state.filters['religion'] in religion_options else 0
     )
     
@@ -1055,24 +2630,18 @@ def main():
             'postcode': postcode_filter, # Kept as postcode (from fixed_app.py)
             'gender': gender_filter,
             'religion': religion_filter,
+            'near_postcode': near_filter,
+            'radius_km': radius_filter,
             'show_all': show_all_results
         }
         # Reset pagination when filters change
         st.session_state.page = 1
+        # Rerun so the sidebar counts reflect the new filters
+        st.rerun()
         
     # Reset filters button
     if st.sidebar.button("Reset Filters"):
-        st.session_state.filters = {
-            'name': '',
-            'trust_name': '',
-            'la': '',
-            'establishment_groups': [], # Changed from school_types to establishment_groups
-            'phase': '',
-            'postcode': '', # Kept as postcode (from fixed_app.py)
-            'gender': '',
-            'religion': '',
-            'show_all': False
-        }
+        st.session_state.filters = dict(DEFAULT_FILTERS, establishment_groups=[])
         # Reset pagination when filters change
         st.session_state.page = 1
         # Rerun to update the UI
@@ -1081,15 +2650,27 @@ def main():
     # Main content
     st.title("England Schools Dashboard")
     
-    # Get current filters
+    # Get current filters; loaders are keyed on their canonical form
     current_filters = st.session_state.filters
+    filter_key = normalize_filters(current_filters)
+    
+    # Pagination
+    page = st.session_state.get("page", 1)
+    per_page = 50  # Increased from 20 to 50
     
-    # Load data with current filters
-    school_types = load_school_types(current_filters)
-    phase_summary = load_phase_summary(current_filters)
-    religion_summary = load_religion_summary(current_filters)
-    gender_summary = load_gender_summary(current_filters)
-    stats = load_summary_stats(current_filters)
+    # Load the charts' aggregates and the school list page together
+    # (a single aggregate query feeds every chart and metric; the list
+    # fragment below picks the page up from the loader cache)
+    results = load_concurrently(
+        aggregates=functools.partial(load_dashboard_aggregates, filter_key),
+        schools=functools.partial(search_schools, filter_key, show_all=current_filters['show_all'], page=page, per_page=per_page)
+    )
+    aggregates = results['aggregates']
+    school_types = aggregates["school_types"]
+    phase_summary = aggregates["phase_summary"]
+    religion_summary = aggregates["religion_summary"]
+    gender_summary = aggregates["gender_summary"]
+    stats = aggregates["stats"]
     
     # Summary statistics
     st.header("Summary Statistics")
@@ -1175,214 +2756,20 @@ def main():
             st.session_state.filters['gender'] = selected_gender
             st.rerun()
     
-    # School list
-    st.header("School List")
-    
-    # Pagination
-    page = st.session_state.get("page", 1)
-    per_page = 50  # Increased from 20 to 50
-    
-    # Search schools with all filters
-    schools, total_count = search_schools(
-        name=current_filters['name'],
-        trust_name=current_filters['trust_name'],
-        la=current_filters['la'],
-        establishment_groups=current_filters['establishment_groups'], # Changed from school_types to establishment_groups
-        phase=current_filters['phase'],
-        postcode=current_filters['postcode'], # Kept as postcode (from fixed_app.py)
-        gender=current_filters['gender'],
-        religion=current_filters['religion'],
-        show_all=current_filters['show_all'],
-        page=page,
-        per_page=per_page
-    )
+    # Map of the matching schools, once ingest.py has located them
+    if locations_available():
+        st.header("School Map")
+        render_school_map(filter_key)
     
-    # Pagination controls (only show if not showing all results)
-    if not current_filters['show_all']:
-        total_pages = max(1, (total_count + per_page - 1) // per_page)
-        
-        col1, col2, col3 = st.columns([1, 3, 1])
-        
-        with col1:
-            if st.button("Previous Page", disabled=(page <= 1)):
-                st.session_state.page = page - 1
-                st.rerun()
-        
-        with col2:
-            st.write(f"Page {page} of {total_pages} (Showing {len(schools)} of {total_count} schools)")
-        
-        with col3:
-            if st.button("Next Page", disabled=(page >= total_pages)):
-                st.session_state.page = page + 1
-                st.rerun()
-    else:
-        st.write(f"Showing all {len(schools)} schools matching your criteria")
+    # School list (pagination, export and details rerun on their own)
+    st.header("School List")
+    render_school_list(current_filters, filter_key, per_page)
     
-    # Display schools
-    if not schools.empty:
-        # Create a DataFrame with only the columns we want to display
-        display_df = schools[['URN', 'EstablishmentName', 'LA (name)', 'TypeOfEstablishment (name)', 'PhaseOfEducation (name)', 'Trusts (name)', 'Gender (name)', 'ReligiousCharacter (name)', 'Postcode']]
-        display_df.columns = ['URN', 'School Name', 'Local Authority', 'Type', 'Phase', 'Trust', 'Gender', 'Religious Character', 'Postcode']
-        
-        # Add download button with proper naming
-        csv = display_df.to_csv(index=False)
-        
-        # Create a descriptive filename based on filters
-        filename_parts = ["schools"]
-        if current_filters['name']:
-            filename_parts.append(f"name_{current_filters['name'].replace(' ', '_')}")
-        if current_filters['trust_name']:
-            filename_parts.append(f"trust_{current_filters['trust_name'].replace(' ', '_')}")
-        if current_filters['la']:
-            filename_parts.append(f"la_{current_filters['la'].replace(' ', '_')}")
-        if current_filters['phase']:
-            filename_parts.append(current_filters['phase'].replace(' ', '_'))
-        
-        filename = "_".join(filename_parts) + ".csv"
-        
-        col1, col2 = st.columns([3, 1])
-        with col2:
-            st.download_button(
-                label="Download Results as CSV",
-                data=csv,
-                file_name=filename,
-                mime="text/csv",
-                help="Download the current search results as a CSV file"
-            )
-        
-        # Display the table with improved formatting
-        st.dataframe(
-            display_df, 
-            use_container_width=True,
-            column_config={
-                "URN": st.column_config.NumberColumn(format="%d"),
-                "School Name": st.column_config.TextColumn(width="large"),
-                "Trust": st.column_config.TextColumn(width="large"),
-            },
-            hide_index=True
-        )
-        
-        # School details
-        st.header("School Details")
-        selected_urn = st.selectbox("Select a school to view details", schools['URN'].tolist(), format_func=lambda x: schools[schools['URN'] == x]['EstablishmentName'].iloc[0])
-        
-        if selected_urn:
-            school_details = get_school_details(selected_urn).iloc[0]
-            
-            # Create tabs for different categories of information
-            tabs = st.tabs(["Basic Info", "Contact Info", "Statistics", "Administrative", "School Infographic"])
-            
-            with tabs[0]:  # Basic Info tab
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.subheader("Basic Information")
-                    st.write(f"**URN:** {school_details['URN']}")
-                    st.write(f"**Name:** {school_details['EstablishmentName']}")
-                    st.write(f"**Type:** {school_details['TypeOfEstablishment (name)']}")
-                    st.write(f"**Phase:** {school_details['PhaseOfEducation (name)']}")
-                    st.write(f"**Local Authority:** {school_details['LA (name)']}")
-                    st.write(f"**Establishment Group:** {school_details['EstablishmentTypeGroup (name)']}")
-                    st.write(f"**Gender:** {school_details['Gender (name)']}")
-                    st.write(f"**Religious Character:** {school_details['ReligiousCharacter (name)']}")
-            
-            with tabs[1]:  # Contact Info tab
-                st.subheader("Contact Information")
-                st.write(f"**Address:** {school_details['FullAddress']}")
-                st.write(f"**Postcode:** {school_details['Postcode']}")
-                st.write(f"**Telephone:** {school_details['TelephoneNum']}")
-                
-                website = school_details['SchoolWebsite']
-                if website and website != 'Not provided':
-                    st.write(f"**Website:** [{website}]({website})")
-                else:
-                    st.write("**Website:** Not provided")
-                
-                st.write(f"**Head Teacher:** {school_details['HeadTeacherFullName']}")
-                st.write(f"**Head Title:** {school_details['HeadPreferredJobTitle']}")
-            
-            with tabs[2]:  # Statistics tab
-                st.subheader("School Statistics")
-                st.write(f"**School Capacity:** {int(school_details['SchoolCapacity'])}")
-                st.write(f"**Number of Pupils:** {int(school_details['NumberOfPupils'])}")
-                st.write(f"**Percentage FSM:** {school_details['PercentageFSM']}%")
-                st.write(f"**Statutory Low Age:** {int(school_details['StatutoryLowAge'])}")
-                st.write(f"**Statutory High Age:** {int(school_details['StatutoryHighAge'])}")
-                st.write(f"**Nursery Provision:** {school_details['NurseryProvision (name)']}")
-                st.write(f"**Official Sixth Form:** {school_details['OfficialSixthForm (name)']}")
-            
-            with tabs[3]:  # Administrative tab
-                st.subheader("Administrative Information")
-                trust_name = school_details['Trusts (name)']
-                st.write(f"**Trust:** {trust_name}")
-                
-                # Add button to view all schools in this trust
-                if trust_name != 'Unknown':
-                    if st.button(f"View All Schools in {trust_name}"):
-                        st.session_state.view_trust = trust_name
-                        st.rerun()
-                
-                st.write(f"**Federation:** {school_details['Federations (name)']}")
-                st.write(f"**District:** {school_details['DistrictAdministrative (name)']}")
-                st.write(f"**Ward:** {school_details['AdministrativeWard (name)']}")
-                st.write(f"**Parliamentary Constituency:** {school_details['ParliamentaryConstituency (name)']}")
-                st.write(f"**Urban/Rural:** {school_details['UrbanRural (name)']}")
-                
-            with tabs[4]:  # Infographic tab
-                st.subheader("School Infographic")
-                st.write("Below is an infographic for this school. You can download it as an image using the button at the bottom.")
-                
-                # Generate the infographic HTML
-                infographic_html = create_infographic_component(school_details)
-                
-                # Display the infographic using st.components.v1.html
-                st.components.v1.html(infographic_html, height=900, scrolling=True)
-    else:
-        st.info("No schools found matching your criteria. Try adjusting your filters.")
+    # Profile of the trust chosen from a school's details
+    render_trust_view(per_page)
     
-    # View all schools in a trust if requested
-    if hasattr(st.session_state, 'view_trust'):
-        trust_name = st.session_state.view_trust
-        st.header(f"All Schools in {trust_name}")
-        
-        # Get all schools in this trust
-        trust_schools = get_trust_schools(trust_name)
-        
-        if not trust_schools.empty:
-            # Create a DataFrame with only the columns we want to display
-            trust_display_df = trust_schools[['URN', 'EstablishmentName', 'LA (name)', 'TypeOfEstablishment (name)', 'PhaseOfEducation (name)', 'Gender (name)', 'ReligiousCharacter (name)', 'Postcode']]
-            trust_display_df.columns = ['URN', 'School Name', 'Local Authority', 'Type', 'Phase', 'Gender', 'Religious Character', 'Postcode']
-            
-            # Add download button for trust schools
-            csv = trust_display_df.to_csv(index=False)
-            filename = f"schools_in_{trust_name.replace(' ', '_')}.csv"
-            
-            col1, col2 = st.columns([3, 1])
-            with col2:
-                st.download_button(
-                    label="Download Trust Schools as CSV",
-                    data=csv,
-                    file_name=filename,
-                    mime="text/csv",
-                    help="Download all schools in this trust as a CSV file"
-                )
-            
-            # Display the table
-            st.dataframe(
-                trust_display_df, 
-                use_container_width=True,
-                column_config={
-                    "URN": st.column_config.NumberColumn(format="%d"),
-                    "School Name": st.column_config.TextColumn(width="large"),
-                },
-                hide_index=True
-            )
-            
-            # Add button to clear trust view
-            if st.button("Clear Trust View"):
-                del st.session_state.view_trust
-                st.rerun()
-        else:
-            st.info(f"No schools found for trust: {trust_name}")
+    if st.query_params.get("debug") == "1":
+        render_diagnostics()
     
     # Footer
     st.markdown("---")
@@ -1390,3 +2777,5 @@ def main():
 
 if __name__ == "__main__":
     main()
+    if PROFILE_METRICS:
+        write_profile_metrics(PROFILE_METRICS)
@@ -0,0 +1,429 @@
+"""Build or refresh schools.db from the GIAS establishment CSV.
+
+Download "All establishment data" (edubasealldataYYYYMMDD.csv) from
+https://get-information-schools.service.gov.uk/Downloads and run:
+
+    python ingest.py edubasealldata20250101.csv --db schools.db
+
+The CSV is streamed in chunks and normalised to the columns the dashboard
+reads. Each row is hashed and only new or changed rows are written, keyed by
+URN, in one transaction per chunk. Establishments no longer in the feed are
+removed. The summary rollups behind the dashboard's landing view, the
+catalog of sidebar filter values, the trust profiles and the spatial index
+of school locations are then rebuilt and metadata.last_updated is bumped
+whenever anything changed, which tells a running dashboard to rebuild its
+caches.
+
+The "Near postcode" radius search needs postcode centroids from the ONS
+Postcode Directory (ONSPD_*_UK.csv, from https://geoportal.statistics.gov.uk):
+
+    python ingest.py --postcodes ONSPD_FEB_2025_UK.csv --db schools.db
+
+To (re)build only the derived tables of an existing database:
+
+    python ingest.py --rebuild-rollups --db schools.db
+"""
+import argparse
+import sqlite3
+import time
+from datetime import datetime
+
+import pandas as pd
+
+# Text columns copied from the CSV, with "Unknown" for blanks as the dashboard expects
+TEXT_COLUMNS = [
+    'EstablishmentName', 'LA (name)', 'TypeOfEstablishment (name)', 'EstablishmentTypeGroup (name)',
+    'PhaseOfEducation (name)', 'Trusts (name)', 'Gender (name)', 'ReligiousCharacter (name)',
+    'Postcode', 'TelephoneNum', 'HeadPreferredJobTitle', 'NurseryProvision (name)',
+    'OfficialSixthForm (name)', 'Federations (name)', 'DistrictAdministrative (name)',
+    'AdministrativeWard (name)', 'ParliamentaryConstituency (name)', 'UrbanRural (name)'
+]
+
+# Numeric columns the dashboard formats with int(), so blanks become 0
+COUNT_COLUMNS = ['SchoolCapacity', 'NumberOfPupils', 'StatutoryLowAge', 'StatutoryHighAge']
+
+ADDRESS_COLUMNS = ['Street', 'Locality', 'Address3', 'Town', 'Postcode']
+HEAD_COLUMNS = ['HeadTitle (name)', 'HeadFirstName', 'HeadLastName']
+
+# Columns of the schools table, in order
+SCHOOL_COLUMNS = (
+    ['URN'] + TEXT_COLUMNS + ['SchoolWebsite', 'FullAddress', 'HeadTeacherFullName']
+    + COUNT_COLUMNS + ['PercentageFSM']
+)
+
+SOURCE_COLUMNS = set(
+    ['URN', 'EstablishmentStatus (name)', 'SchoolWebsite', 'PercentageFSM']
+    + TEXT_COLUMNS + COUNT_COLUMNS + ADDRESS_COLUMNS + HEAD_COLUMNS
+)
+
+# Charted columns pre-aggregated nationally and per local authority, keyed by
+# the labels the dashboard's chart summaries use
+ROLLUP_DIMENSIONS = {
+    'EstablishmentTypeGroup': 'EstablishmentTypeGroup (name)',
+    'PhaseOfEducation': 'PhaseOfEducation (name)',
+    'ReligiousCharacter': 'ReligiousCharacter (name)',
+    'Gender': 'Gender (name)'
+}
+
+# Sidebar filter columns whose distinct values and counts are catalogued
+CATALOG_COLUMNS = [
+    'LA (name)', 'EstablishmentTypeGroup (name)', 'PhaseOfEducation (name)',
+    'Gender (name)', 'ReligiousCharacter (name)', 'Trusts (name)'
+]
+
+# Upper bounds of the free school meals bands in the trust profiles; higher
+# percentages fall in FSM_TOP_BAND and unpublished ones in FSM_UNPUBLISHED.
+# The dashboard buckets schools with these too when a database has no rollups
+FSM_BANDS = [(10, '0-10%'), (20, '10-20%'), (30, '20-30%'), (40, '30-40%')]
+FSM_TOP_BAND = '40%+'
+FSM_UNPUBLISHED = 'Not published'
+
+# ONSPD columns holding the formatted postcode and its centroid; postcodes
+# without a grid reference have a latitude of 99.999999
+ONSPD_COLUMNS = {'pcds': 'postcode', 'lat': 'lat', 'long': 'lon'}
+
+# Establishments shown by the dashboard unless --all-statuses is given
+OPEN_STATUSES = {'Open', 'Open, but proposed to close'}
+
+
+def normalise_chunk(chunk, statuses=OPEN_STATUSES):
+    """Turn a chunk of raw GIAS rows into rows of the schools table"""
+    for column in SOURCE_COLUMNS - set(chunk.columns):
+        chunk[column] = ''
+    chunk = chunk.fillna('')
+    chunk = chunk.apply(lambda column: column.str.strip())
+
+    if statuses:
+        chunk = chunk[chunk['EstablishmentStatus (name)'].isin(statuses)]
+    chunk = chunk[chunk['URN'] != '']
+
+    rows = pd.DataFrame({'URN': chunk['URN'].astype(int)})
+
+    for column in TEXT_COLUMNS:
+        rows[column] = chunk[column].replace('', 'Unknown')
+    # Postcodes are stored upper case with a single space, e.g. "SW1A 1AA"
+    rows['Postcode'] = chunk['Postcode'].str.upper().str.split().str.join(' ').replace('', 'Unknown')
+    rows['SchoolWebsite'] = chunk['SchoolWebsite'].replace('', 'Not provided')
+
+    rows['FullAddress'] = chunk[ADDRESS_COLUMNS].apply(
+        lambda parts: ', '.join(part for part in parts if part), axis=1
+    ).replace('', 'Unknown')
+    rows['HeadTeacherFullName'] = chunk[HEAD_COLUMNS].apply(
+        lambda parts: ' '.join(part for part in parts if part and part != 'Not applicable'), axis=1
+    ).replace('', 'Unknown')
+
+    for column in COUNT_COLUMNS:
+        rows[column] = pd.to_numeric(chunk[column], errors='coerce').fillna(0).astype(float)
+    rows['PercentageFSM'] = pd.to_numeric(chunk['PercentageFSM'], errors='coerce')
+
+    rows = rows[SCHOOL_COLUMNS]
+    rows['row_hash'] = row_hashes(rows)
+    return rows
+
+
+def row_hashes(rows):
+    """Stable content hash of each row, used to skip unchanged establishments"""
+    hashes = pd.util.hash_pandas_object(rows, index=False)
+    return hashes.map(lambda value: format(value, '016x'))
+
+
+def ensure_schools_table(conn):
+    """Create the schools and metadata tables, or prepare an existing database for upserts"""
+    numeric = set(COUNT_COLUMNS) | {'PercentageFSM'}
+    definitions = ', '.join(
+        f'"{column}" {"INTEGER" if column == "URN" else "REAL" if column in numeric else "TEXT"}'
+        for column in SCHOOL_COLUMNS
+    )
+    with conn:
+        conn.execute(f'CREATE TABLE IF NOT EXISTS schools ({definitions}, row_hash TEXT)')
+        conn.execute('CREATE TABLE IF NOT EXISTS metadata (last_updated TEXT)')
+
+        # Databases built before this pipeline have no row hashes or unique URNs
+        existing = {row[1] for row in conn.execute('PRAGMA table_info(schools)')}
+        if 'row_hash' not in existing:
+            conn.execute('ALTER TABLE schools ADD COLUMN row_hash TEXT')
+        conn.execute('DELETE FROM schools WHERE rowid NOT IN (SELECT MIN(rowid) FROM schools GROUP BY URN)')
+        conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS ux_schools_urn ON schools(URN)')
+
+
+def upsert_rows(conn, rows):
+    """Insert new rows and overwrite changed ones in a single transaction"""
+    columns = SCHOOL_COLUMNS + ['row_hash']
+    names = ', '.join(f'"{column}"' for column in columns)
+    placeholders = ', '.join('?' for _ in columns)
+    updates = ', '.join(f'"{column}" = excluded."{column}"' for column in columns if column != 'URN')
+    query = f'''
+        INSERT INTO schools ({names}) VALUES ({placeholders})
+        ON CONFLICT(URN) DO UPDATE SET {updates}
+    '''
+    values = rows.astype(object).where(rows.notna(), None).itertuples(index=False, name=None)
+    with conn:
+        conn.executemany(query, values)
+
+
+def build_rollups(conn):
+    """Rebuild the national and per-LA counts for each charted column.
+
+    Runs inside the caller's transaction. National rows have an empty la.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS summary_rollups (
+            la TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            value TEXT,
+            count INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_summary_rollups_la ON summary_rollups(la)')
+    conn.execute('DELETE FROM summary_rollups')
+    for dimension, column in ROLLUP_DIMENSIONS.items():
+        conn.execute(f'''
+            INSERT INTO summary_rollups (la, dimension, value, count)
+            SELECT '', ?, "{column}", COUNT(*) FROM schools GROUP BY "{column}"
+        ''', [dimension])
+        conn.execute(f'''
+            INSERT INTO summary_rollups (la, dimension, value, count)
+            SELECT "LA (name)", ?, "{column}", COUNT(*) FROM schools
+            WHERE "LA (name)" IS NOT NULL
+            GROUP BY "LA (name)", "{column}"
+        ''', [dimension])
+
+
+def build_dimension_catalog(conn):
+    """Rebuild the distinct values and school counts of each sidebar filter column.
+
+    Runs inside the caller's transaction.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS dimension_catalog (
+            dimension TEXT NOT NULL,
+            value TEXT,
+            count INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('DELETE FROM dimension_catalog')
+    for column in CATALOG_COLUMNS:
+        conn.execute(f'''
+            INSERT INTO dimension_catalog (dimension, value, count)
+            SELECT ?, "{column}", COUNT(*) FROM schools GROUP BY "{column}"
+        ''', [column])
+
+
+def build_trust_rollups(conn):
+    """Rebuild each trust's headline figures and its phase, LA and FSM breakdowns.
+
+    Runs inside the caller's transaction. Both tables are keyed by trust name,
+    so a trust profile is two primary key lookups.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS trust_summary (
+            trust TEXT PRIMARY KEY,
+            schools INTEGER NOT NULL,
+            pupils INTEGER NOT NULL,
+            capacity INTEGER NOT NULL,
+            local_authorities INTEGER NOT NULL,
+            fsm_mean REAL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS trust_rollups (
+            trust TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (trust, dimension, value)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('DELETE FROM trust_summary')
+    conn.execute('DELETE FROM trust_rollups')
+
+    members = '"Trusts (name)" IS NOT NULL AND "Trusts (name)" != \'Unknown\''
+    conn.execute(f'''
+        INSERT INTO trust_summary (trust, schools, pupils, capacity, local_authorities, fsm_mean)
+        SELECT "Trusts (name)", COUNT(*), COALESCE(SUM(NumberOfPupils), 0), COALESCE(SUM(SchoolCapacity), 0),
+               COUNT(DISTINCT "LA (name)"), AVG(PercentageFSM)
+        FROM schools WHERE {members}
+        GROUP BY "Trusts (name)"
+    ''')
+
+    bands = ' '.join(f"WHEN PercentageFSM < {upper} THEN '{label}'" for upper, label in FSM_BANDS)
+    dimensions = {
+        'PhaseOfEducation': '''COALESCE("PhaseOfEducation (name)", 'Unknown')''',
+        'LA': '''COALESCE("LA (name)", 'Unknown')''',
+        'FSM': f"CASE WHEN PercentageFSM IS NULL THEN '{FSM_UNPUBLISHED}' {bands} ELSE '{FSM_TOP_BAND}' END"
+    }
+    for dimension, value in dimensions.items():
+        conn.execute(f'''
+            INSERT INTO trust_rollups (trust, dimension, value, count)
+            SELECT "Trusts (name)", ?, {value}, COUNT(*) FROM schools
+            WHERE {members}
+            GROUP BY "Trusts (name)", {value}
+        ''', [dimension])
+
+
+def build_school_locations(conn):
+    """Rebuild the R*Tree of school locations from their postcode centroids.
+
+    Runs inside the caller's transaction and does nothing until postcodes
+    have been loaded. Each school is a point box keyed by URN, with its exact
+    coordinates in the auxiliary lat/lon columns.
+    """
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'postcodes'").fetchone():
+        return
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS school_locations
+        USING rtree(urn, min_lat, max_lat, min_lon, max_lon, +lat, +lon)
+    ''')
+    conn.execute('DELETE FROM school_locations')
+    conn.execute('''
+        INSERT INTO school_locations (urn, min_lat, max_lat, min_lon, max_lon, lat, lon)
+        SELECT schools.URN, postcodes.lat, postcodes.lat, postcodes.lon, postcodes.lon, postcodes.lat, postcodes.lon
+        FROM schools JOIN postcodes ON postcodes.postcode = schools.Postcode
+    ''')
+
+
+def build_derived_tables(conn):
+    """Rebuild every table derived from schools; runs inside the caller's transaction"""
+    build_rollups(conn)
+    build_dimension_catalog(conn)
+    build_trust_rollups(conn)
+    build_school_locations(conn)
+
+
+def stamp_version(conn):
+    """Set metadata.last_updated to now, which running dashboards treat as a new data version"""
+    stamp = datetime.now().isoformat(sep=' ', timespec='seconds')
+    if conn.execute('UPDATE metadata SET last_updated = ?', [stamp]).rowcount == 0:
+        conn.execute('INSERT INTO metadata (last_updated) VALUES (?)', [stamp])
+
+
+def ingest(csv_path, db_path="schools.db", chunk_size=20000, statuses=OPEN_STATUSES, encoding="cp1252"):
+    """Apply a GIAS CSV to the database; returns counts of inserted, updated and deleted rows"""
+    started = time.time()
+    conn = sqlite3.connect(db_path)
+    ensure_schools_table(conn)
+
+    known = dict(conn.execute('SELECT URN, row_hash FROM schools'))
+    seen = set()
+    inserted = updated = 0
+
+    chunks = pd.read_csv(
+        csv_path,
+        encoding=encoding,
+        dtype=str,
+        keep_default_na=False,
+        usecols=lambda column: column in SOURCE_COLUMNS,
+        chunksize=chunk_size
+    )
+    for chunk in chunks:
+        rows = normalise_chunk(chunk, statuses)
+        rows = rows.drop_duplicates('URN', keep='last')
+        seen.update(rows['URN'].tolist())
+
+        previous = rows['URN'].map(known)
+        changed = rows[previous.ne(rows['row_hash'])]
+        if not changed.empty:
+            upsert_rows(conn, changed)
+        inserted += int(previous.isna().sum())
+        updated += len(changed) - int(previous.isna().sum())
+
+    # Establishments that have closed or left the feed
+    removed = [urn for urn in known if urn not in seen]
+    with conn:
+        for start in range(0, len(removed), 500):
+            batch = removed[start:start + 500]
+            conn.execute(f'DELETE FROM schools WHERE URN IN ({", ".join("?" for _ in batch)})', batch)
+
+    if inserted or updated or removed:
+        # Derived tables and the new version become visible together
+        with conn:
+            build_derived_tables(conn)
+            stamp_version(conn)
+
+    conn.close()
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "deleted": len(removed),
+        "seconds": round(time.time() - started, 1)
+    }
+
+
+def ensure_postcodes_table(conn):
+    """Create the table of postcode centroids; runs inside the caller's transaction"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS postcodes (
+            postcode TEXT PRIMARY KEY,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def load_postcodes(csv_path, db_path="schools.db", chunk_size=200000):
+    """Load ONSPD postcode centroids and re-locate the schools; returns the number of postcodes"""
+    conn = sqlite3.connect(db_path)
+    ensure_schools_table(conn)
+    with conn:
+        ensure_postcodes_table(conn)
+        conn.execute('DELETE FROM postcodes')
+    
+    loaded = 0
+    chunks = pd.read_csv(csv_path, dtype={'pcds': str}, usecols=list(ONSPD_COLUMNS), chunksize=chunk_size)
+    for chunk in chunks:
+        chunk = chunk.rename(columns=ONSPD_COLUMNS).dropna()
+        chunk = chunk[chunk['lat'].between(-90, 90)]
+        # Same form as the schools table: upper case with a single space
+        chunk['postcode'] = chunk['postcode'].str.upper().str.split().str.join(' ')
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO postcodes (postcode, lat, lon) VALUES (?, ?, ?)',
+                chunk[['postcode', 'lat', 'lon']].itertuples(index=False, name=None)
+            )
+        loaded += len(chunk)
+    
+    with conn:
+        build_school_locations(conn)
+        stamp_version(conn)
+    conn.close()
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh schools.db from the GIAS establishment CSV")
+    parser.add_argument("csv", nargs="?", help="GIAS 'All establishment data' CSV file")
+    parser.add_argument("--db", default="schools.db", help="SQLite database to create or update")
+    parser.add_argument("--chunk-size", type=int, default=20000, help="CSV rows read per batch")
+    parser.add_argument("--all-statuses", action="store_true", help="Keep closed and proposed establishments too")
+    parser.add_argument("--encoding", default="cp1252", help="CSV encoding (GIAS files are Windows-1252)")
+    parser.add_argument("--postcodes", help="ONS Postcode Directory CSV to load postcode centroids from")
+    parser.add_argument("--rebuild-rollups", action="store_true", help="Only rebuild the rollups, catalog and school locations of --db")
+    args = parser.parse_args()
+
+    if args.postcodes:
+        print(f"{load_postcodes(args.postcodes, db_path=args.db)} postcodes loaded")
+    if args.rebuild_rollups:
+        conn = sqlite3.connect(args.db)
+        with conn:
+            build_derived_tables(conn)
+            stamp_version(conn)
+        conn.close()
+        print("Derived tables rebuilt")
+        return
+    if not args.csv:
+        if args.postcodes:
+            return
+        parser.error("a GIAS CSV file is required unless --postcodes or --rebuild-rollups is given")
+
+    result = ingest(
+        args.csv,
+        db_path=args.db,
+        chunk_size=args.chunk_size,
+        statuses=None if args.all_statuses else OPEN_STATUSES,
+        encoding=args.encoding
+    )
+    print(f"{result['inserted']} inserted, {result['updated']} updated, {result['deleted']} deleted in {result['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""Load test the dashboard with simulated concurrent sessions.
+
+Starts the dashboard under `streamlit run` on a local port (or uses one that is
+already running, with --url) and connects N sessions to it over Streamlit's
+websocket protocol, the way browsers do. Each session replays a realistic
+visit: open the page, pick a local authority and phase, page through the
+results, open a school's details, search by name and reset the filters.
+Widget changes and button clicks are sent as the browser would send them, so
+buttons inside fragments rerun only their fragment.
+
+For each level of concurrency it reports latency percentiles per interaction,
+throughput, errors and the server's memory growth per session:
+
+    python loadtest.py --sessions 1 5 10 20 --iterations 3
+    python loadtest.py --sessions 10 --db bench_500000.db --output loadtest.json
+
+The latency of an interaction is the time from sending it to the end of the
+rerun it causes, including any st.rerun() it triggers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime
+
+import numpy as np
+from tornado.websocket import websocket_connect
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "combined_app.py")
+
+# Widget element types a session can interact with
+WIDGET_TYPES = ("button", "selectbox", "text_input", "slider", "checkbox")
+
+FINISHED = (ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY)
+
+# Words that appear in many school names
+SEARCH_TERMS = ["park", "oak", "church", "green", "academy", "primary", "st", "hill"]
+
+# One visit: (interaction name, action, widget label, value); the value of a
+# selectbox is "random" (any option but the first, "All") or "first"
+VISIT = [
+    ("select local authority", "select", "Local Authority", "random"),
+    ("apply filters", "click", "Apply Filters", None),
+    ("next page", "click", "Next Page", None),
+    ("next page", "click", "Next Page", None),
+    ("view school details", "select", "Select a school to view details", "random"),
+    ("select phase", "select", "Phase of Education", "random"),
+    ("apply filters", "click", "Apply Filters", None),
+    ("type school name", "type", "School Name", "search term"),
+    ("apply filters", "click", "Apply Filters", None),
+    ("reset filters", "click", "Reset Filters", None)
+]
+
+
+class Session:
+    """One simulated browser session on the dashboard"""
+
+    def __init__(self, url, timeout=60, seed=0):
+        self.url = url
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.connection = None
+        # Received messages the server may later send by reference only
+        self.messages = {}
+        # Widgets on the page by label: (element type, proto, fragment id)
+        self.widgets = {}
+        # Widget values this session has set, sent with every rerun like the browser does
+        self.values = {}
+        self.errors = []
+
+    async def connect(self):
+        self.connection = await websocket_connect(
+            self.url, subprotocols=["streamlit"], max_message_size=200 * 2**20
+        )
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+    async def rerun(self, fragment_id="", trigger=None):
+        """Request a rerun and wait for it to finish; returns its latency in seconds"""
+        msg = BackMsg()
+        state = msg.rerun_script
+        state.query_string = ""
+        state.page_script_hash = ""
+        state.fragment_id = fragment_id
+        for value in self.values.values():
+            state.widget_states.widgets.append(value)
+        if trigger is not None:
+            state.widget_states.widgets.append(trigger)
+        if not fragment_id:
+            self.widgets = {}
+
+        started = time.perf_counter()
+        await self.connection.write_message(msg.SerializeToString(), binary=True)
+        await asyncio.wait_for(self._receive_until_finished(), self.timeout)
+        return time.perf_counter() - started
+
+    async def _receive_until_finished(self):
+        while True:
+            payload = await self.connection.read_message()
+            if payload is None:
+                raise ConnectionError("The server closed the connection")
+            msg = ForwardMsg()
+            msg.ParseFromString(payload)
+            if msg.ref_hash:
+                msg = self.messages[msg.ref_hash]
+            elif msg.metadata.cacheable:
+                self.messages[msg.hash] = msg
+
+            kind = msg.WhichOneof("type")
+            if kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                self._add_element(msg.delta.new_element, msg.delta.fragment_id)
+            elif kind == "script_finished":
+                if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("The dashboard failed to compile")
+                if msg.script_finished in FINISHED:
+                    return
+
+    def _add_element(self, element, fragment_id):
+        kind = element.WhichOneof("type")
+        if kind == "exception":
+            self.errors.append(f"{element.exception.type}: {element.exception.message}")
+        elif kind in WIDGET_TYPES:
+            widget = getattr(element, kind)
+            self.widgets[widget.label] = (kind, widget, fragment_id)
+
+    async def interact(self, action, label, value):
+        """Change a widget or click a button; None when the widget is not on the page"""
+        if label not in self.widgets:
+            return None
+        kind, widget, fragment_id = self.widgets[label]
+        if widget.disabled:
+            return None
+
+        state = BackMsg().rerun_script.widget_states.widgets.add()
+        state.id = widget.id
+        if action == "click":
+            state.trigger_value = True
+            return await self.rerun(fragment_id, trigger=state)
+        if action == "select":
+            if len(widget.options) < 2:
+                return None
+            state.int_value = 0 if value == "first" else self.random.randrange(1, len(widget.options))
+        elif action == "type":
+            state.string_value = self.random.choice(SEARCH_TERMS) if value == "search term" else value
+        self.values[widget.id] = state
+        return await self.rerun(fragment_id)
+
+
+async def visit(url, seed, iterations, think, timeout, samples, ready):
+    """One session: open the page, then replay the visit iterations times"""
+    session = Session(url, timeout=timeout, seed=seed)
+    try:
+        await session.connect()
+        samples.append(("open page", await session.rerun()))
+        ready.append(session)
+        for _ in range(iterations):
+            for name, action, label, value in VISIT:
+                if think:
+                    await asyncio.sleep(session.random.uniform(0, think))
+                latency = await session.interact(action, label, value)
+                if latency is not None:
+                    samples.append((name, latency))
+    except (asyncio.TimeoutError, ConnectionError, OSError) as error:
+        session.errors.append(f"{type(error).__name__}: {error}")
+    return session
+
+
+def server_rss(pid):
+    """Resident memory of the server process in bytes (Linux only; None elsewhere)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def latency_summary(latencies):
+    latencies = np.array(latencies) * 1000
+    if not len(latencies):
+        return {"count": 0}
+    p50, p90, p95, p99 = np.percentile(latencies, [50, 90, 95, 99])
+    return {
+        "count": int(len(latencies)),
+        "p50_ms": round(float(p50), 1),
+        "p90_ms": round(float(p90), 1),
+        "p95_ms": round(float(p95), 1),
+        "p99_ms": round(float(p99), 1),
+        "max_ms": round(float(latencies.max()), 1)
+    }
+
+
+async def run_level(url, sessions, iterations, think, timeout, ramp, pid):
+    """Run one level of concurrency and summarise it"""
+    samples = []
+    ready = []
+    peak = baseline = server_rss(pid) if pid else None
+
+    async def sample_memory():
+        nonlocal peak
+        while True:
+            await asyncio.sleep(0.2)
+            rss = server_rss(pid)
+            if rss is not None:
+                peak = max(peak or 0, rss)
+
+    sampler = asyncio.ensure_future(sample_memory()) if pid else None
+    started = time.perf_counter()
+
+    async def delayed(index):
+        if ramp:
+            await asyncio.sleep(ramp * index / sessions)
+        return await visit(url, index, iterations, think, timeout, samples, ready)
+
+    finished = await asyncio.gather(*[delayed(index) for index in range(sessions)])
+    duration = time.perf_counter() - started
+    # Measured before disconnecting, while every session still holds its state
+    after = server_rss(pid) if pid else None
+    if sampler:
+        sampler.cancel()
+    for session in finished:
+        session.close()
+
+    errors = [error for session in finished for error in session.errors]
+    actions = {}
+    for name, latency in samples:
+        actions.setdefault(name, []).append(latency)
+    memory = None
+    if baseline is not None and after is not None:
+        memory = {
+            "baseline_mb": round(baseline / 2**20, 1),
+            "peak_mb": round(peak / 2**20, 1),
+            "after_mb": round(after / 2**20, 1),
+            "growth_per_session_mb": round((after - baseline) / 2**20 / sessions, 2)
+        }
+    return {
+        "sessions": sessions,
+        "interactions": len(samples),
+        "errors": len(errors),
+        "error_messages": sorted(set(errors))[:10],
+        "duration_s": round(duration, 2),
+        "throughput_per_s": round(len(samples) / duration, 2),
+        "latency": latency_summary([latency for _, latency in samples]),
+        "actions": {name: latency_summary(latencies) for name, latencies in actions.items()},
+        "memory": memory
+    }
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_server(db_path=None, engine=None, startup_timeout=120):
+    """Start the dashboard on a free local port; returns (process, base URL)"""
+    port = free_port()
+    env = dict(os.environ)
+    if db_path:
+        env["SCHOOLS_DB"] = os.path.abspath(db_path)
+    if engine:
+        env["SCHOOLS_FILTER_ENGINE"] = engine
+    process = subprocess.Popen([
+        sys.executable, "-m", "streamlit", "run", APP_PATH,
+        "--server.headless", "true",
+        "--server.address", "127.0.0.1",
+        "--server.port", str(port),
+        "--server.fileWatcherType", "none",
+        "--browser.gatherUsageStats", "false"
+    ], env=env, cwd=os.path.dirname(APP_PATH), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The dashboard exited during startup")
+        try:
+            with urllib.request.urlopen(f"{base}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return process, base
+        except OSError:
+            time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError(f"The dashboard did not start within {startup_timeout}s")
+
+
+async def load_test(base, levels, iterations, think, timeout, ramp, pid):
+    url = base.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+
+    # One session first, so startup work (indexes, caches) is not counted as load
+    warmup = await run_level(url, 1, 1, 0, max(timeout, 300), 0, pid)
+    results = []
+    for sessions in levels:
+        result = await run_level(url, sessions, iterations, think, timeout, ramp, pid)
+        print_level(result)
+        results.append(result)
+    return warmup, results
+
+
+def print_level(result):
+    latency = result["latency"]
+    print(
+        f"{result['sessions']:>4} sessions: {result['interactions']} interactions in {result['duration_s']}s "
+        f"({result['throughput_per_s']}/s), p50 {latency.get('p50_ms')} ms, p95 {latency.get('p95_ms')} ms, "
+        f"p99 {latency.get('p99_ms')} ms, {result['errors']} errors"
+    )
+    if result["memory"]:
+        memory = result["memory"]
+        print(
+            f"      server memory {memory['baseline_mb']} -> {memory['after_mb']} MB "
+            f"(peak {memory['peak_mb']} MB, {memory['growth_per_session_mb']} MB per session)"
+        )
+    for name, summary in sorted(result["actions"].items()):
+        print(f"      {name:<24} n={summary['count']:<5} p50 {summary.get('p50_ms')} ms  p95 {summary.get('p95_ms')} ms")
+    for message in result["error_messages"]:
+        print(f"      error: {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the dashboard with concurrent simulated sessions")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10], help="Concurrent sessions, one level per value")
+    parser.add_argument("--iterations", type=int, default=2, help="Visits replayed by each session")
+    parser.add_argument("--think", type=float, default=0.0, help="Maximum pause between interactions, in seconds")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Seconds over which sessions are started")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for any one interaction")
+    parser.add_argument("--url", help="Test an already running dashboard instead of starting one")
+    parser.add_argument("--db", help="Database for the started dashboard (default: SCHOOLS_DB or schools.db)")
+    parser.add_argument("--engine", choices=["sql", "memory"], help="Filter engine for the started dashboard")
+    parser.add_argument("--output", help="JSON file to write the results to")
+    args = parser.parse_args()
+
+    process = None
+    if args.url:
+        base, pid = args.url, None
+    else:
+        process, base = start_server(args.db, args.engine)
+        pid = process.pid
+    try:
+        warmup, results = asyncio.run(
+            load_test(base, args.sessions, args.iterations, args.think, args.timeout, args.ramp, pid)
+        )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    if args.output:
+        report = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "url": base,
+            "iterations": args.iterations,
+            "think_s": args.think,
+            "warmup": warmup,
+            "levels": results
+        }
+        with open(args.output, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Results written to {args.output}")
+    if any(result["errors"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
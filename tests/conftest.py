@@ -0,0 +1,41 @@
+import logging
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark
+
+
+@pytest.fixture(scope="session")
+def db_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("data") / "schools.db")
+    benchmark.generate(path, 2000)
+    return path
+
+
+@pytest.fixture(scope="session")
+def app(db_path):
+    """combined_app, configured to serve the synthetic database"""
+    # combined_app reads its configuration when imported
+    os.environ["SCHOOLS_DB"] = db_path
+    os.environ.setdefault("SCHOOLS_FILTER_ENGINE", "sql")
+    # Outside "streamlit run" every st call warns about the missing script context
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
+    import combined_app
+    return combined_app
+
+
+@pytest.fixture
+def write_db(db_path):
+    """Run statements against the database the app is serving"""
+    def write(*statements):
+        conn = sqlite3.connect(db_path)
+        with conn:
+            for statement, params in statements:
+                conn.execute(statement, params)
+        conn.close()
+    return write
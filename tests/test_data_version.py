@@ -0,0 +1,32 @@
+import time
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_failed_rebuild_is_retried(app, db_path, write_db, monkeypatch):
+    monitor = app.DataVersionMonitor(db_path)
+    served = monitor.served
+    calls = []
+
+    def flaky_aggregates(filters):
+        calls.append(app.data_version())
+        if len(calls) == 1:
+            raise app.sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(app, "load_dashboard_aggregates", flaky_aggregates)
+    write_db(("UPDATE metadata SET last_updated = ?", ["test-v2"]))
+
+    assert monitor.check() == served
+    wait_for(lambda: calls and monitor.pending is None)
+    assert monitor.served == served
+
+    # No further writes: the next run still picks up the new version
+    monitor.check()
+    wait_for(lambda: monitor.served == "test-v2")
+    assert calls == ["test-v2", "test-v2"]
+    assert monitor.pending is None
@@ -0,0 +1,26 @@
+import sqlite3
+
+
+def test_urn_index_not_duplicated(app, tmp_path, monkeypatch):
+    conn = sqlite3.connect(str(tmp_path / "schools.db"))
+    conn.execute('CREATE TABLE schools (URN INTEGER, EstablishmentName TEXT)')
+    conn.execute('CREATE INDEX idx_schools_urn ON schools(URN)')
+    conn.execute('CREATE UNIQUE INDEX ux_schools_urn ON schools(URN)')
+
+    # A database created by an older dashboard, then refreshed by ingest.py
+    monkeypatch.setattr(app, "SCHEMA_INDEXES", {'idx_schools_urn': 'URN', 'idx_schools_name': 'EstablishmentName, URN'})
+    assert app.ensure_indexes(conn) == ['idx_schools_name']
+
+    assert app.index_columns(conn) == {
+        'ux_schools_urn': ('URN',),
+        'idx_schools_name': ('EstablishmentName', 'URN')
+    }
+    conn.close()
+
+
+def test_ingested_database_has_one_urn_index(app, db_path):
+    conn = sqlite3.connect(db_path)
+    app.ensure_indexes(conn)
+    urn_indexes = [name for name, columns in app.index_columns(conn).items() if columns == ('URN',)]
+    conn.close()
+    assert urn_indexes == ['ux_schools_urn']
@@ -0,0 +1,43 @@
+import pytest
+
+
+def clear_loader_caches(app, *names):
+    for name, cache in app._loader_caches().items():
+        if not names or name in names:
+            cache.clear()
+
+
+@pytest.mark.parametrize("engine", ["sql", "memory"])
+def test_radius_search_skips_deleted_schools(app, write_db, monkeypatch, engine):
+    monkeypatch.setattr(app, "FILTER_ENGINE", engine)
+    clear_loader_caches(app)
+    postcode = app.read_sql(
+        'SELECT Postcode FROM schools GROUP BY Postcode ORDER BY COUNT(*) DESC LIMIT 1'
+    ).iloc[0, 0]
+    filters = app.normalize_filters(dict(app.DEFAULT_FILTERS, near_postcode=postcode, radius_km=50))
+
+    page, total = app.search_schools(filters, page=2, per_page=5)
+    assert len(page) == 5
+
+    # Deleted before the data version changes: the cached ranking still lists it
+    deleted = int(page['URN'].iloc[2])
+    write_db(("DELETE FROM schools WHERE URN = ?", [deleted]))
+    clear_loader_caches(app, "search_schools")
+
+    schools, count = app.search_schools(filters, page=2, per_page=5)
+    assert count == total
+    assert schools['URN'].tolist() == [urn for urn in page['URN'] if urn != deleted]
+    assert schools['Distance (km)'].tolist() == page[page['URN'] != deleted]['Distance (km)'].tolist()
+    assert list(schools.columns) == list(page.columns)
+
+
+def test_compiled_filters_follow_search_index(app, monkeypatch):
+    filters = app.normalize_filters(dict(app.DEFAULT_FILTERS, name='park'))
+    monkeypatch.setattr(app, "search_index_available", lambda: True)
+    assert 'schools_fts' in app.compile_filters(filters)[0]
+
+    # A replaced database without the search index must not reuse the cached SQL
+    monkeypatch.setattr(app, "search_index_available", lambda: False)
+    clause, params = app.compile_filters(filters)
+    assert 'schools_fts' not in clause
+    assert params == ['%park%']
@@ -0,0 +1,22 @@
+import pandas as pd
+
+
+def test_fallback_matches_rollups(app, monkeypatch):
+    trusts = app.read_sql(
+        '''SELECT "Trusts (name)" FROM schools WHERE "Trusts (name)" != 'Unknown'
+        GROUP BY "Trusts (name)" ORDER BY COUNT(*) DESC LIMIT 20'''
+    )['Trusts (name)']
+    assert app.trust_rollups_available()
+    from_rollups = {trust: app.load_trust_profile(trust) for trust in trusts}
+
+    # Databases built before the rollups aggregate the trust's schools instead
+    monkeypatch.setattr(app, "trust_rollups_available", lambda: False)
+    app._loader_caches()['load_trust_profile'].clear()
+    for trust in trusts:
+        expected, profile = from_rollups[trust], app.load_trust_profile(trust)
+        assert list(profile['fsm']['FSM']) == app.FSM_BAND_ORDER
+        for key, value in expected.items():
+            if isinstance(value, pd.DataFrame):
+                pd.testing.assert_frame_equal(profile[key], value, check_dtype=False)
+            else:
+                assert profile[key] == value or abs(profile[key] - value) < 1e-9, key